@@ -0,0 +1,28 @@
+"""add (deployment_status, updated_at) index on prefab_specs
+
+Revision ID: 029df619c570
+Revises: 6c0b50471560
+Create Date: 2026-10-15 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '029df619c570'
+down_revision: Union[str, Sequence[str], None] = '6c0b50471560'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_status_updated', 'prefab_specs', ['deployment_status', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_status_updated', table_name='prefab_specs')
@@ -0,0 +1,75 @@
+"""store deployment_status and secret status as TINYINT UNSIGNED
+
+Revision ID: 3af2380e710e
+Revises: b8d05e2dac02
+Create Date: 2026-10-15 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3af2380e710e'
+down_revision: Union[str, Sequence[str], None] = 'b8d05e2dac02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 枚举名与整数编码的映射，需与 db.models 中的 IntEnum 保持一致
+DEPLOYMENT_STATUS_CODES = {'DEPLOYED': 1, 'FAILED': 2}
+SECRET_STATUS_CODES = {'ACTIVE': 1, 'DISABLED': 2, 'EXPIRED': 3}
+
+
+def _to_code(column: str, codes: dict) -> str:
+    """枚举名 -> 整数编码的 CASE 表达式"""
+    whens = " ".join(f"WHEN '{name}' THEN {code}" for name, code in codes.items())
+    return f"CASE {column} {whens} END"
+
+
+def _to_name(column: str, codes: dict) -> str:
+    """整数编码 -> 枚举名的 CASE 表达式"""
+    whens = " ".join(f"WHEN {code} THEN '{name}'" for name, code in codes.items())
+    return f"CASE {column} {whens} END"
+
+
+def _replace_column(table: str, column: str, new_type, value_expr: str, comment: str, indexes: list) -> None:
+    """新建临时列并回填数据后替换原列，同时重建涉及该列的索引"""
+    for name, _ in indexes:
+        op.drop_index(name, table_name=table)
+    op.add_column(table, sa.Column(f'{column}_tmp', new_type, nullable=True))
+    op.execute(f"UPDATE {table} SET {column}_tmp = {value_expr}")
+    op.drop_column(table, column)
+    op.alter_column(table, f'{column}_tmp', new_column_name=column, existing_type=new_type, nullable=False, comment=comment)
+    for name, columns in indexes:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_column(
+        'prefab_specs', 'deployment_status', mysql.TINYINT(unsigned=True),
+        _to_code('deployment_status', DEPLOYMENT_STATUS_CODES), '部署状态',
+        [('idx_status_updated', ['deployment_status', 'updated_at'])]
+    )
+    _replace_column(
+        'user_secrets', 'status', mysql.TINYINT(unsigned=True),
+        _to_code('status', SECRET_STATUS_CODES), '密钥状态',
+        [('idx_status', ['status'])]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_column(
+        'user_secrets', 'status', sa.Enum('ACTIVE', 'DISABLED', 'EXPIRED', name='secretstatus'),
+        _to_name('status', SECRET_STATUS_CODES), None,
+        [('idx_status', ['status'])]
+    )
+    _replace_column(
+        'prefab_specs', 'deployment_status', sa.Enum('DEPLOYED', 'FAILED', name='deploymentstatus'),
+        _to_name('deployment_status', DEPLOYMENT_STATUS_CODES), '部署状态',
+        [('idx_status_updated', ['deployment_status', 'updated_at'])]
+    )
@@ -0,0 +1,51 @@
+"""store user_secrets.secret_value as binary ciphertext
+
+Revision ID: 4e7a1c9b3f20
+Revises: 9d41c7e2a5b3
+Create Date: 2026-10-15 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a1c9b3f20'
+down_revision: Union[str, Sequence[str], None] = '9d41c7e2a5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 已有的文本令牌按原字节保留，decrypt_bytes 仍可识别并解密
+    op.alter_column(
+        'user_secrets',
+        'secret_value',
+        existing_type=sa.Text(),
+        type_=sa.LargeBinary(),
+        existing_nullable=False,
+        comment='加密后的密钥值（二进制密文）',
+        existing_comment='加密后的密钥值'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 二进制格式（0x02 | nonce | 密文 | tag）转回 "v2:" + base64 文本令牌后再改回 TEXT
+    op.execute(
+        "UPDATE user_secrets "
+        "SET secret_value = CONCAT('v2:', REPLACE(TO_BASE64(SUBSTRING(secret_value, 2)), '\\n', '')) "
+        "WHERE LEFT(secret_value, 1) = 0x02"
+    )
+    op.alter_column(
+        'user_secrets',
+        'secret_value',
+        existing_type=sa.LargeBinary(),
+        type_=sa.Text(),
+        existing_nullable=False,
+        comment='加密后的密钥值',
+        existing_comment='加密后的密钥值（二进制密文）'
+    )
@@ -0,0 +1,52 @@
+"""drop single-column indexes already covered by primary keys or composite indexes
+
+Revision ID: 6bf5171a2cec
+Revises: f2373cf992a2
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6bf5171a2cec'
+down_revision: Union[str, Sequence[str], None] = 'f2373cf992a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 主键已有索引
+    op.drop_index(op.f('ix_audit_logs_id'), table_name='audit_logs')
+    op.drop_index(op.f('ix_prefab_specs_id'), table_name='prefab_specs')
+    op.drop_index(op.f('ix_webhook_events_id'), table_name='webhook_events')
+    op.drop_index(op.f('ix_user_secrets_id'), table_name='user_secrets')
+    # 与 idx_request 完全重复
+    op.drop_index(op.f('ix_audit_logs_request_id'), table_name='audit_logs')
+    # 已被复合索引的前缀列覆盖
+    op.drop_index(op.f('ix_audit_logs_user_id'), table_name='audit_logs')
+    op.drop_index(op.f('ix_prefab_specs_prefab_id'), table_name='prefab_specs')
+    op.drop_index('idx_deployment_status', table_name='prefab_specs')
+    op.drop_index(op.f('ix_webhook_events_prefab_id'), table_name='webhook_events')
+    op.drop_index(op.f('ix_webhook_events_processed'), table_name='webhook_events')
+    # 没有按 version 单独查询的场景
+    op.drop_index(op.f('ix_prefab_specs_version'), table_name='prefab_specs')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_prefab_specs_version'), 'prefab_specs', ['version'], unique=False)
+    op.create_index(op.f('ix_webhook_events_processed'), 'webhook_events', ['processed'], unique=False)
+    op.create_index(op.f('ix_webhook_events_prefab_id'), 'webhook_events', ['prefab_id'], unique=False)
+    op.create_index('idx_deployment_status', 'prefab_specs', ['deployment_status'], unique=False)
+    op.create_index(op.f('ix_prefab_specs_prefab_id'), 'prefab_specs', ['prefab_id'], unique=False)
+    op.create_index(op.f('ix_audit_logs_user_id'), 'audit_logs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_audit_logs_request_id'), 'audit_logs', ['request_id'], unique=False)
+    op.create_index(op.f('ix_user_secrets_id'), 'user_secrets', ['id'], unique=False)
+    op.create_index(op.f('ix_webhook_events_id'), 'webhook_events', ['id'], unique=False)
+    op.create_index(op.f('ix_prefab_specs_id'), 'prefab_specs', ['id'], unique=False)
+    op.create_index(op.f('ix_audit_logs_id'), 'audit_logs', ['id'], unique=False)
@@ -0,0 +1,36 @@
+"""add covering (user_id, status, prefab_id, secret_name) index on user_secrets
+
+Revision ID: 9d41c7e2a5b3
+Revises: 3af2380e710e
+Create Date: 2026-10-15 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41c7e2a5b3'
+down_revision: Union[str, Sequence[str], None] = '3af2380e710e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'idx_user_status_prefab_secret',
+        'user_secrets',
+        ['user_id', 'status', 'prefab_id', 'secret_name'],
+        unique=False
+    )
+    # 已被 idx_user_prefab_secret / idx_user_status_prefab_secret 的前缀列覆盖
+    op.drop_index(op.f('ix_user_secrets_user_id'), table_name='user_secrets')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_user_secrets_user_id'), 'user_secrets', ['user_id'], unique=False)
+    op.drop_index('idx_user_status_prefab_secret', table_name='user_secrets')
@@ -0,0 +1,38 @@
+"""partition audit_logs by month on created_at
+
+Revision ID: b8d05e2dac02
+Revises: 6bf5171a2cec
+Create Date: 2026-10-15 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d05e2dac02'
+down_revision: Union[str, Sequence[str], None] = '6bf5171a2cec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # MySQL 要求分区列包含在每个唯一键中，因此主键扩展为 (id, created_at)
+    op.execute("ALTER TABLE audit_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+    # 后续月份的分区由 `db-rotate-partitions` 定期追加
+    op.execute(
+        "ALTER TABLE audit_logs PARTITION BY RANGE (TO_DAYS(created_at)) ("
+        "PARTITION phistory VALUES LESS THAN (TO_DAYS('2026-10-01')), "
+        "PARTITION p202610 VALUES LESS THAN (TO_DAYS('2026-11-01')), "
+        "PARTITION p202611 VALUES LESS THAN (TO_DAYS('2026-12-01')), "
+        "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE audit_logs REMOVE PARTITIONING")
+    op.execute("ALTER TABLE audit_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
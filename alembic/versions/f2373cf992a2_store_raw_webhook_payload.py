@@ -0,0 +1,34 @@
+"""store raw webhook payload bytes instead of JSON
+
+Revision ID: f2373cf992a2
+Revises: 029df619c570
+Create Date: 2026-10-15 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2373cf992a2'
+down_revision: Union[str, Sequence[str], None] = '029df619c570'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('webhook_events', sa.Column('payload_raw', sa.LargeBinary(length=16777215), nullable=True, comment='原始事件载荷（签名覆盖的请求体字节）'))
+    op.execute("UPDATE webhook_events SET payload_raw = CAST(payload AS CHAR CHARACTER SET utf8mb4)")
+    op.alter_column('webhook_events', 'payload_raw', existing_type=sa.LargeBinary(length=16777215), nullable=False, existing_comment='原始事件载荷（签名覆盖的请求体字节）')
+    op.drop_column('webhook_events', 'payload')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('webhook_events', sa.Column('payload', sa.JSON(), nullable=True, comment='完整的事件载荷'))
+    op.execute("UPDATE webhook_events SET payload = CAST(CONVERT(payload_raw USING utf8mb4) AS JSON)")
+    op.alter_column('webhook_events', 'payload', existing_type=sa.JSON(), nullable=False, existing_comment='完整的事件载荷')
+    op.drop_column('webhook_events', 'payload_raw')
@@ -1,5 +1,5 @@
 """依赖注入模块"""
-from .auth import get_current_user, User
+from .auth import get_current_user, JWTAuthMiddleware, User
 
-__all__ = ["get_current_user", "User"]
+__all__ = ["get_current_user", "JWTAuthMiddleware", "User"]
 
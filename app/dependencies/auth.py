@@ -1,63 +1,97 @@
 """
 认证和授权依赖
 """
+import hashlib
 import logging
-from typing import Optional
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from pydantic import BaseModel
+import time
+from typing import Any, Optional
+import jwt
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, Request, status
+from pydantic import BaseModel, ConfigDict, PrivateAttr, ValidationError
+from starlette.types import ASGIApp, Receive, Scope, Send
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
-# HTTP Bearer token 安全方案
-security = HTTPBearer()
+# JWT 验证器及其参数在模块加载时构造一次，避免每个请求重复构建
+JWT_AUDIENCE = "prefab-gateway"
+_JWT_KEY = settings.jwt_secret_key.encode()
+_JWT_ALGS = [settings.jwt_algorithm]
+_JWT_OPTIONS = {"require": ["exp", "sub", "aud"], "verify_aud": True}
+_jwt_decoder = jwt.PyJWT(options=_JWT_OPTIONS)
+
+# token 语法预检上限（字节），超出直接拒绝，不进入验签
+MAX_TOKEN_LENGTH = 8192
+MAX_TOKEN_HEADER_LENGTH = 1024
+
+# 已验证 token 的缓存 TTL（秒），同时受 token 自身的 exp 限制
+USER_CACHE_TTL = 30
+
+# 超级权限范围，拥有该范围的用户通过所有 scope 检查
+_SCOPE_ADMIN = "admin"
 
 
 class User(BaseModel):
-    """用户信息"""
+    """用户信息（不可变，可在认证缓存中跨请求共享）"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     user_id: str
     username: Optional[str] = None
-    scopes: list[str] = []
+    scopes: tuple[str, ...] = ()
+    
+    # scopes 的集合形式，构造时计算一次，供 scope 检查做 O(1) 查找
+    _scope_set: frozenset[str] = PrivateAttr(default_factory=frozenset)
+    
+    def model_post_init(self, __context: Any) -> None:
+        self._scope_set = frozenset(self.scopes)
+
 
+# token 摘要 -> (User, 缓存失效时间戳)，命中时跳过 JWT 验签和 User 构造
+_user_cache: TTLCache[bytes, tuple[User, float]] = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL)
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> User:
+
+def authenticate_token(token: str) -> Optional[User]:
     """
-    从 JWT token 中解析当前用户
+    校验 JWT token 并解析用户
     
     Args:
-        credentials: HTTP Authorization 凭证
+        token: Bearer token
     
     Returns:
-        User 对象
-    
-    Raises:
-        HTTPException: 如果 token 无效或过期
+        User 对象，如果 token 无效或过期返回 None
     """
-    token = credentials.credentials
+    # 语法预检：畸形或超长 token 不进入缓存查询和验签
+    if (
+        len(token) > MAX_TOKEN_LENGTH
+        or token.count(".") != 2
+        or token.index(".") > MAX_TOKEN_HEADER_LENGTH
+    ):
+        logger.warning("Rejected malformed JWT before verification")
+        return None
     
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    # 缓存命中：直接返回已构造的 User
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _user_cache.get(cache_key)
+    if cached is not None:
+        user, expires_at = cached
+        if time.time() < expires_at:
+            return user
+        _user_cache.pop(cache_key, None)
     
     try:
         # 解码 JWT（需要验证 audience）
-        payload = jwt.decode(
+        payload = _jwt_decoder.decode(
             token,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm],
-            audience='prefab-gateway'  # 验证 audience 字段
+            _JWT_KEY,
+            algorithms=_JWT_ALGS,
+            audience=JWT_AUDIENCE  # 验证 audience 字段
         )
         
         user_id: str = payload.get("sub")
         if user_id is None:
             logger.warning("JWT payload missing 'sub' field")
-            raise credentials_exception
+            return None
         
         username: Optional[str] = payload.get("username")
         scopes: list[str] = payload.get("scopes", [])
@@ -68,12 +102,68 @@ async def get_current_user(
             scopes=scopes
         )
         
-        logger.debug(f"Authenticated user: {user_id}")
-        return user
-        
-    except JWTError as e:
-        logger.warning(f"JWT validation failed: {e}")
-        raise credentials_exception from e
+    except (jwt.InvalidTokenError, ValidationError) as e:
+        logger.warning("JWT validation failed: %s", e)
+        return None
+    
+    # 缓存时间不超过 token 的剩余有效期
+    now = time.time()
+    expires_at = now + USER_CACHE_TTL
+    exp = payload.get("exp")
+    if exp is not None:
+        expires_at = min(expires_at, float(exp))
+    if expires_at > now:
+        _user_cache[cache_key] = (user, expires_at)
+    
+    logger.debug("Authenticated user: %s", user_id)
+    return user
+
+
+class JWTAuthMiddleware:
+    """
+    JWT 认证中间件（纯 ASGI）
+    
+    每个请求只解析一次 Authorization 头，认证成功时将 User 存入 request.state.user。
+    中间件本身不拒绝请求，是否要求认证由路由上的 get_current_user 依赖决定
+    """
+    
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer" and token:
+                        user = authenticate_token(token)
+                        if user is not None:
+                            scope.setdefault("state", {})["user"] = user
+                    break
+        await self.app(scope, receive, send)
+
+
+async def get_current_user(request: Request) -> User:
+    """
+    获取当前认证用户（由 JWTAuthMiddleware 解析）
+    
+    Args:
+        request: 当前请求
+    
+    Returns:
+        User 对象
+    
+    Raises:
+        HTTPException: 如果请求未携带有效 token
+    """
+    user = getattr(request.state, "user", None)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
 
 
 def require_scope(required_scope: str):
@@ -87,8 +177,9 @@ def require_scope(required_scope: str):
         依赖函数
     """
     async def scope_checker(user: User = Depends(get_current_user)) -> User:
-        if required_scope not in user.scopes and "admin" not in user.scopes:
-            logger.warning(f"User {user.user_id} lacks required scope: {required_scope}")
+        scope_set = user._scope_set
+        if not (_SCOPE_ADMIN in scope_set or required_scope in scope_set):
+            logger.warning("User %s lacks required scope: %s", user.user_id, required_scope)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. Required scope: {required_scope}"
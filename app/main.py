@@ -5,11 +5,17 @@ AI 预制件生态系统的 API 网关
 """
 import logging
 from contextlib import asynccontextmanager
+from typing import Any, Dict
+import httpx
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.openapi.utils import get_openapi
+from fastapi.responses import ORJSONResponse
 
 from config.settings import settings
 from services.spec_cache_service import spec_cache_service
+from services.vault_service import vault_service
+from app.dependencies import JWTAuthMiddleware
 from app.routers import run, secrets, prefabs, webhooks
 
 # 配置日志
@@ -30,16 +36,32 @@ async def lifespan(app: FastAPI):
     # 连接 Redis
     await spec_cache_service.connect()
     
+    # 创建共享的下游 HTTP 客户端（复用连接池）
+    app.state.http_client = httpx.AsyncClient(
+        timeout=settings.http_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections
+        )
+    )
+    
     # 启动清理守护进程
     from services import file_handler_service
     import asyncio
     cleanup_task = asyncio.create_task(
         file_handler_service.start_cleanup_daemon(
             interval_seconds=300,  # 每 5 分钟清理一次
-            max_age_seconds=3600   # 清理 1 小时前的目录
+            max_age_seconds=3600,  # 清理 1 小时前的目录
+            measure_size=settings.workspace_cleanup_measure_size
         )
     )
     
+    # 启动统计落库任务（调用次数 / 密钥最后使用时间在内存中累计，定期批量写入）
+    stats_tasks = [
+        asyncio.create_task(spec_cache_service.start_stats_flush_daemon()),
+        asyncio.create_task(vault_service.start_usage_flush_daemon()),
+    ]
+    
     logger.info(f"Prefab Gateway started on {settings.host}:{settings.port}")
     
     yield
@@ -47,6 +69,12 @@ async def lifespan(app: FastAPI):
     # 关闭
     logger.info("Shutting down Prefab Gateway...")
     cleanup_task.cancel()
+    for task in stats_tasks:
+        task.cancel()
+    # 等待统计任务写入剩余数据
+    await asyncio.gather(*stats_tasks, return_exceptions=True)
+    await app.state.http_client.aclose()
+    await file_handler_service.close()
     await spec_cache_service.close()
     logger.info("Prefab Gateway stopped")
 
@@ -58,9 +86,13 @@ app = FastAPI(
     description="AI 预制件生态系统的唯一、安全、可控的流量入口",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# JWT 认证中间件（每个请求只解析一次 token）
+app.add_middleware(JWTAuthMiddleware)
+
 # CORS 中间件
 app.add_middleware(
     CORSMiddleware,
@@ -77,6 +109,34 @@ app.include_router(prefabs.router)
 app.include_router(webhooks.router)
 
 
+def custom_openapi() -> Dict[str, Any]:
+    """生成 OpenAPI 文档，并为需要认证的接口声明 Bearer 安全方案"""
+    if app.openapi_schema:
+        return app.openapi_schema
+    
+    schema = get_openapi(
+        title=app.title,
+        version=app.version,
+        description=app.description,
+        routes=app.routes
+    )
+    schema.setdefault("components", {}).setdefault("securitySchemes", {})["HTTPBearer"] = {
+        "type": "http",
+        "scheme": "bearer"
+    }
+    # /v1 下的所有接口都依赖 get_current_user
+    for path, operations in schema["paths"].items():
+        if path.startswith("/v1/"):
+            for operation in operations.values():
+                operation["security"] = [{"HTTPBearer": []}]
+    
+    app.openapi_schema = schema
+    return schema
+
+
+app.openapi = custom_openapi
+
+
 @app.get("/", tags=["System"])
 async def root():
     """根路径 - 系统信息"""
@@ -103,6 +163,9 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        workers=settings.workers,
+        loop="uvloop",
+        http="httptools"
     )
 
@@ -3,83 +3,108 @@
 """
 import logging
 from typing import Dict, Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.dependencies.auth import get_current_user, User
 from services.spec_cache_service import spec_cache_service
-from db.session import get_db
+from db.session import get_db, get_readonly_db
 from db.models import PrefabSpec, DeploymentStatus
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1/prefabs", tags=["Prefabs"])
 
+# 数据库中的时间均为 UTC 朴素时间，序列化时标注为 UTC（"Z" 后缀）
+_DATETIME_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
 
-@router.get("")
+
+@router.get("", response_model=List[Dict[str, Any]])
 async def list_prefabs(
     status: str = None,
+    limit: int = Query(50, ge=1, le=500, description="每页数量"),
+    offset: int = Query(0, ge=0, description="偏移量"),
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-) -> List[Dict[str, Any]]:
+    db: AsyncSession = Depends(get_readonly_db)
+) -> Response:
     """
-    列出所有预制件
+    列出所有预制件（分页）
+    
+    只查询列表所需的列和 manifest 字段，由数据库完成 JSON 字段提取，
+    避免传输完整的 spec_json
     
     Args:
         status: 可选，筛选部署状态 (deployed, deploying, failed 等)
+        limit: 每页数量
+        offset: 偏移量
         user: 当前用户
         db: 数据库会话
     
     Returns:
         预制件列表
     """
-    query = select(PrefabSpec)
+    spec_json = PrefabSpec.spec_json
+    query = select(
+        PrefabSpec.prefab_id,
+        PrefabSpec.version,
+        PrefabSpec.deployment_status,
+        PrefabSpec.deployment_error,
+        PrefabSpec.knative_service_url,
+        PrefabSpec.deployed_at,
+        PrefabSpec.updated_at,
+        spec_json["name"].label("name"),
+        spec_json["description"].label("description"),
+        spec_json["tags"].label("tags"),
+        spec_json["functions"].label("functions"),
+        spec_json["author"].label("author"),
+        spec_json["github_url"].label("github_url"),
+    )
     
     # 筛选状态
     if status:
         try:
-            deployment_status = DeploymentStatus(status)
+            deployment_status = DeploymentStatus[status.upper()]
             query = query.where(PrefabSpec.deployment_status == deployment_status)
-        except ValueError:
+        except KeyError:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
+                status_code=400,
                 detail=f"Invalid status: {status}"
             )
     
-    # 按更新时间降序排序
-    query = query.order_by(PrefabSpec.updated_at.desc())
+    # 按更新时间降序排序并分页
+    query = query.order_by(PrefabSpec.updated_at.desc()).limit(limit).offset(offset)
     
     result = await db.execute(query)
-    specs = result.scalars().all()
+    rows = result.all()
     
     # 转换为响应格式
     prefabs = []
-    for spec in specs:
-        spec_data = spec.spec_json if spec.spec_json else {}
+    for row in rows:
+        functions = row.functions or []
         
         # 基础信息
         prefab_info = {
-            "id": spec.prefab_id,
-            "version": spec.version,
-            "name": spec_data.get("name", spec.prefab_id),
-            "description": spec_data.get("description", ""),
-            "tags": spec_data.get("tags", []),
-            "deployment_status": spec.deployment_status.value,
-            "knative_service_url": spec.knative_service_url,
-            "functions": spec_data.get("functions", []),
-            "deployed_at": spec.deployed_at.isoformat() if spec.deployed_at else None,
-            "updated_at": spec.updated_at.isoformat() if spec.updated_at else None,
+            "id": row.prefab_id,
+            "version": row.version,
+            "name": row.name if row.name is not None else row.prefab_id,
+            "description": row.description if row.description is not None else "",
+            "tags": row.tags if row.tags is not None else [],
+            "deployment_status": row.deployment_status.label,
+            "knative_service_url": row.knative_service_url,
+            "functions": functions,
+            "deployed_at": row.deployed_at,
+            "updated_at": row.updated_at,
         }
         
         # 元数据（来自 manifest）
-        if "author" in spec_data:
-            prefab_info["author"] = spec_data["author"]
-        if "github_url" in spec_data:
-            prefab_info["github_url"] = spec_data["github_url"]
+        if row.author is not None:
+            prefab_info["author"] = row.author
+        if row.github_url is not None:
+            prefab_info["github_url"] = row.github_url
         
         # 密钥需求分析
-        functions = spec_data.get("functions", [])
         all_secrets = []
         for func in functions:
             if "secrets" in func and func["secrets"]:
@@ -97,13 +122,18 @@ async def list_prefabs(
         prefab_info["secrets"] = unique_secrets
         
         # 如果部署失败，添加错误信息
-        if spec.deployment_status == DeploymentStatus.FAILED and spec.deployment_error:
-            prefab_info["deployment_error"] = spec.deployment_error
+        if row.deployment_status == DeploymentStatus.FAILED and row.deployment_error:
+            prefab_info["deployment_error"] = row.deployment_error
         
         prefabs.append(prefab_info)
     
-    logger.info(f"Listed {len(prefabs)} prefabs for user {user.user_id}")
-    return prefabs
+    logger.info("Listed %s prefabs for user %s (offset=%s, limit=%s)", len(prefabs), user.user_id, offset, limit)
+    
+    # 直接由 orjson 序列化（datetime 在 C 层格式化为 UTC ISO 8601）
+    return Response(
+        content=orjson.dumps(prefabs, option=_DATETIME_OPTIONS),
+        media_type="application/json"
+    )
 
 
 @router.get("/{prefab_id}/{version}/spec")
@@ -130,7 +160,7 @@ async def get_prefab_spec(
     spec = await spec_cache_service.get_spec(prefab_id, version, db)
     
     if not spec:
-        logger.warning(f"Spec not found: {prefab_id}@{version}")
+        logger.warning("Spec not found: %s@%s", prefab_id, version)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Prefab {prefab_id}@{version} not found"
@@ -142,7 +172,7 @@ async def get_prefab_spec(
         "version": spec.get("version", version),
         "name": spec.get("name", ""),
         "description": spec.get("description", ""),
-        "functions": spec.get("functions", [])
+        "functions": spec_cache_service.public_functions(spec)
     }
 
 
@@ -161,5 +191,5 @@ async def cache_prefab_spec(
     """
     # 简化实现：这里应该检查用户是否有管理员权限
     await spec_cache_service.set_spec(prefab_id, version, spec, db)
-    logger.info(f"Cached spec for {prefab_id}@{version}")
+    logger.info("Cached spec for %s@%s", prefab_id, version)
 
@@ -1,21 +1,103 @@
 """
 /v1/run 端点 - 核心执行引擎
 """
+import asyncio
 import logging
+import re
 import uuid
 import httpx
-from typing import Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+import msgspec
+import orjson
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
 
 from app.dependencies import get_current_user, User
-from models import RunRequestPayload, RunResponsePayload, CallResult, CallStatus, ErrorResponse
+from models import (
+    RunRequestPayload, RunResponsePayload, ErrorResponse, CallStatus,
+    PrefabCallStruct, RunRequestStruct, CallResultStruct, RunResponseStruct
+)
 from services import vault_service, acl_service, spec_cache_service, file_handler_service
 from config.settings import settings
+from db.session import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1", tags=["Execution"])
 
+# 参数类型 -> Python 类型的映射（用于简化的输入类型检查）
+_TYPE_CHECKS: Dict[str, type | tuple[type, ...]] = {
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+# /v1/run 请求体解码器与响应编码器（按类型预编译，可复用）
+_RUN_REQUEST_DECODER = msgspec.json.Decoder(RunRequestStruct)
+_RUN_RESPONSE_ENCODER = msgspec.json.Encoder()
+
+# msgspec 错误信息中的路径片段，如 `$.calls[0].version`
+_ERROR_PATH_TOKEN = re.compile(r"\.(\w+)|\[(\d+)\]")
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """获取应用级共享的下游 HTTP 客户端（依赖注入）"""
+    return request.app.state.http_client
+
+
+def _decode_error_detail(error: msgspec.MsgspecError) -> Dict[str, Any]:
+    """将 msgspec 的解码错误转换为 FastAPI 422 响应中的错误条目"""
+    message, _, path = str(error).partition(" - at `")
+    loc: list[str | int] = ["body"]
+    for name, index in _ERROR_PATH_TOKEN.findall(path):
+        loc.append(int(index) if index else name)
+    return {
+        "type": "value_error" if isinstance(error, msgspec.ValidationError) else "json_invalid",
+        "loc": tuple(loc),
+        "msg": message,
+    }
+
+
+async def parse_run_payload(request: Request) -> RunRequestStruct:
+    """
+    解析 /v1/run 请求体（依赖注入）
+    
+    由 msgspec 直接从原始字节解码并校验为 Struct，避免 pydantic 模型的构造开销
+    """
+    body = await request.body()
+    try:
+        return _RUN_REQUEST_DECODER.decode(body)
+    except msgspec.DecodeError as e:  # ValidationError 是 DecodeError 的子类
+        raise RequestValidationError([_decode_error_detail(e)], body=body)
+
+
+def _inline_schema_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    """将 JSON Schema 中指向 $defs 的引用展开为内联定义"""
+    if isinstance(node, dict):
+        if "$ref" in node:
+            return _inline_schema_refs(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: _inline_schema_refs(value, defs) for key, value in node.items() if key != "$defs"}
+    if isinstance(node, list):
+        return [_inline_schema_refs(item, defs) for item in node]
+    return node
+
+
+# 请求体由 parse_run_payload 手动解析，需要显式声明 OpenAPI 文档中的请求体结构
+_run_request_schema = RunRequestPayload.model_json_schema()
+_RUN_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": _inline_schema_refs(_run_request_schema, _run_request_schema.get("$defs", {}))
+            }
+        }
+    }
+}
+
 
 @router.post(
     "/run",
@@ -26,12 +108,14 @@ router = APIRouter(prefix="/v1", tags=["Execution"])
         404: {"model": ErrorResponse},
         422: {"model": ErrorResponse},
         503: {"model": ErrorResponse},
-    }
+    },
+    openapi_extra=_RUN_REQUEST_OPENAPI
 )
 async def run_prefabs(
-    payload: RunRequestPayload,
-    user: User = Depends(get_current_user)
-) -> RunResponsePayload:
+    user: User = Depends(get_current_user),
+    payload: RunRequestStruct = Depends(parse_run_payload),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+) -> Response:
     """
     执行一个或多个预制件调用
     
@@ -44,182 +128,215 @@ async def run_prefabs(
     """
     # 生成唯一的请求 ID
     request_id = str(uuid.uuid4())
-    logger.info(f"[{request_id}] Processing run request with {len(payload.calls)} calls for user {user.user_id}")
+    logger.info("[%s] Processing run request with %s calls for user %s", request_id, len(payload.calls), user.user_id)
     
-    results: list[CallResult] = []
+    # 一次性批量获取所有调用涉及的规格（相同的预制件版本只查询一次）
+    # 会话只在查询期间持有，不跨越下游调用与文件传输占用连接池
+    async with AsyncSessionLocal() as db:
+        specs = await spec_cache_service.mget_specs(
+            [(call.prefab_id, call.version) for call in payload.calls],
+            db
+        )
     
-    # 串行处理每个调用
-    for idx, call in enumerate(payload.calls):
-        logger.info(f"[{request_id}] Processing call {idx + 1}/{len(payload.calls)}: {call.prefab_id}@{call.version}")
-        
-        workspace = None
-        try:
-            # Step 1: 获取预制件规格
-            spec = await spec_cache_service.get_spec(call.prefab_id, call.version)
-            if not spec:
-                logger.error(f"[{request_id}] Spec not found: {call.prefab_id}@{call.version}")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Prefab {call.prefab_id}@{call.version} not found"
-                )
-            
-            # 获取函数定义
-            function_def = None
-            for func in spec.get("functions", []):
-                if func.get("name") == call.function_name:
-                    function_def = func
-                    break
-            
-            if not function_def:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Function {call.function_name} not found in prefab {call.prefab_id}"
-                )
-            
-            # Step 2: 输入校验
-            await validate_inputs(call.inputs, function_def, request_id)
-            
-            # Step 3: 权限检查（InputFile）
-            await check_input_file_permissions(call.inputs, function_def, user.user_id, request_id)
-            
-            # Step 4: 创建工作空间
-            workspace = file_handler_service.create_workspace(f"{request_id}-{idx}")
-            
-            # Step 5: 下载 InputFile 到工作空间
-            processed_inputs = await file_handler_service.download_input_files(
-                function_def,
-                call.inputs,
-                workspace,
-                request_id
-            )
-            
-            # Step 6: 密钥解析
-            resolved_secrets = await resolve_secrets(
-                user.user_id,
-                call.prefab_id,
-                function_def,
-                request_id
-            )
-            
-            # Step 7: 构建下游请求（符合 Gateway 标准格式）
-            downstream_payload = {
-                "inputs": processed_inputs,      # 函数输入参数
-                "workspace": str(workspace),     # 文件处理工作空间
-                "_secrets": resolved_secrets     # 密钥配置
-            }
-            
-            # Step 8: 路由与调用
-            output = await invoke_knative_service(
-                call.prefab_id,
-                call.version,
-                call.function_name,
-                downstream_payload,
-                request_id
-            )
-            
-            # Step 9: 上传 OutputFile 到 S3
-            processed_output = await file_handler_service.upload_output_files(
-                function_def,
-                output,
-                workspace,
-                request_id
-            )
-            
-            # Step 10: 响应处理（授予文件所有权）
-            await handle_output_files(processed_output, function_def, user.user_id, request_id)
-            
-            # 成功
-            results.append(CallResult(
-                status=CallStatus.SUCCESS,
-                output=processed_output
-            ))
-            logger.info(f"[{request_id}] Call {idx + 1} completed successfully")
-            
-        except HTTPException:
-            # 已知错误，直接抛出
-            raise
-        except Exception as e:
-            # 未知错误
-            logger.error(f"[{request_id}] Call {idx + 1} failed with unexpected error: {e}", exc_info=True)
-            results.append(CallResult(
-                status=CallStatus.FAILED,
-                error={"message": str(e), "type": type(e).__name__}
-            ))
-        finally:
-            # 清理工作空间
-            if workspace:
-                file_handler_service.cleanup_workspace(workspace, request_id)
+    # 并发处理所有调用（调用之间相互独立），并发度受 max_parallel_calls 限制
+    semaphore = asyncio.Semaphore(settings.max_parallel_calls)
+    
+    async def run_call(idx: int, call: PrefabCallStruct) -> CallResultStruct:
+        async with semaphore:
+            spec = specs.get((call.prefab_id, call.version))
+            return await process_call(idx, call, spec, len(payload.calls), user, http_client, request_id)
+    
+    tasks = [asyncio.create_task(run_call(idx, call)) for idx, call in enumerate(payload.calls)]
+    try:
+        if tasks:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # 任一调用失败（或请求本身被取消）时立即取消其余调用：
+        # 请求整体会以错误返回，其余调用不应再继续调用下游、上传文件并授予所有权
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    # 按调用顺序抛出第一个异常（被取消的调用不计入）
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    results: list[CallResultStruct] = [task.result() for task in tasks]
     
     # 构建响应
     overall_status = "COMPLETED" if all(r.status == CallStatus.SUCCESS for r in results) else "PARTIAL_SUCCESS"
     
-    return RunResponsePayload(
-        job_id=request_id,
-        status=overall_status,
-        results=results
+    # response_model 仅用于文档，响应体由 msgspec 直接编码
+    return Response(
+        _RUN_RESPONSE_ENCODER.encode(RunResponseStruct(
+            job_id=request_id,
+            status=overall_status,
+            results=results
+        )),
+        media_type="application/json"
     )
 
 
-async def validate_inputs(
-    inputs: Dict[str, Any],
-    function_def: Dict[str, Any],
+async def process_call(
+    idx: int,
+    call: PrefabCallStruct,
+    spec: Optional[Dict[str, Any]],
+    total: int,
+    user: User,
+    http_client: httpx.AsyncClient,
     request_id: str
-) -> None:
-    """验证输入参数"""
-    parameters = function_def.get("parameters", [])
+) -> CallResultStruct:
+    """执行单个预制件调用"""
+    logger.info("[%s] Processing call %s/%s: %s@%s", request_id, idx + 1, total, call.prefab_id, call.version)
     
-    for param in parameters:
-        param_name = param.get("name")
-        param_required = param.get("required", True)
-        param_type = param.get("type", "string")
+    workspace = None
+    try:
+        # Step 1: 校验预制件规格（已在请求入口批量获取）
+        if not spec:
+            logger.error("[%s] Spec not found: %s@%s", request_id, call.prefab_id, call.version)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Prefab {call.prefab_id}@{call.version} not found"
+            )
+        
+        # 获取函数定义
+        function_def = spec_cache_service.find_function(spec, call.function_name)
         
-        if param_required and param_name not in inputs:
-            logger.error(f"[{request_id}] Missing required parameter: {param_name}")
+        if not function_def:
             raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Missing required parameter: {param_name}"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Function {call.function_name} not found in prefab {call.prefab_id}"
             )
         
-        # 简化的类型检查
-        if param_name in inputs:
-            value = inputs[param_name]
-            type_check_map = {
-                "string": str,
-                "number": (int, float),
-                "integer": int,
-                "boolean": bool,
-                "array": list,
-                "object": dict,
-            }
-            expected_type = type_check_map.get(param_type)
-            if expected_type and not isinstance(value, expected_type):
-                logger.error(f"[{request_id}] Type mismatch for {param_name}: expected {param_type}, got {type(value)}")
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail=f"Type mismatch for parameter {param_name}: expected {param_type}"
-                )
+        # Step 2-3: 输入校验与权限检查（InputFile）
+        validate_and_check_inputs(call.inputs, function_def, user.user_id, request_id)
+        
+        # Step 4: 创建工作空间
+        workspace = file_handler_service.create_workspace(f"{request_id}-{idx}")
+        
+        # Step 5: 下载 InputFile 到工作空间
+        processed_inputs = await file_handler_service.download_input_files(
+            function_def,
+            call.inputs,
+            workspace,
+            request_id
+        )
+        
+        # Step 6: 密钥解析
+        resolved_secrets = await resolve_secrets(
+            user.user_id,
+            call.prefab_id,
+            function_def,
+            request_id
+        )
+        
+        # Step 7: 构建下游请求（符合 Gateway 标准格式）
+        downstream_payload = {
+            "inputs": processed_inputs,      # 函数输入参数
+            "workspace": str(workspace),     # 文件处理工作空间
+            "_secrets": resolved_secrets     # 密钥配置
+        }
+        
+        # Step 8: 路由与调用
+        output = await invoke_knative_service(
+            http_client,
+            call.prefab_id,
+            call.version,
+            call.function_name,
+            downstream_payload,
+            request_id
+        )
+        
+        # Step 9: 上传 OutputFile 到 S3
+        processed_output = await file_handler_service.upload_output_files(
+            function_def,
+            output,
+            workspace,
+            request_id
+        )
+        
+        # Step 10: 响应处理（授予文件所有权）
+        await handle_output_files(processed_output, function_def, user.user_id, request_id)
+        
+        # 成功
+        logger.info("[%s] Call %s completed successfully", request_id, idx + 1)
+        return CallResultStruct(
+            status=CallStatus.SUCCESS,
+            output=processed_output
+        )
+        
+    except HTTPException:
+        # 已知错误，直接抛出
+        raise
+    except Exception as e:
+        # 未知错误
+        logger.error("[%s] Call %s failed with unexpected error: %s", request_id, idx + 1, e, exc_info=True)
+        return CallResultStruct(
+            status=CallStatus.FAILED,
+            error={"message": str(e), "type": type(e).__name__}
+        )
+    finally:
+        # 清理工作空间
+        if workspace:
+            file_handler_service.cleanup_workspace(workspace, request_id)
 
 
-async def check_input_file_permissions(
+def validate_and_check_inputs(
     inputs: Dict[str, Any],
     function_def: Dict[str, Any],
     user_id: str,
     request_id: str
 ) -> None:
-    """检查 InputFile 类型参数的权限"""
+    """验证输入参数，并检查 InputFile 类型参数的权限（单次遍历参数定义；纯内存操作，同步执行）"""
     parameters = function_def.get("parameters", [])
+    s3_uris: list[str] = []
     
     for param in parameters:
-        if param.get("type") == "InputFile":
-            param_name = param.get("name")
-            if param_name in inputs:
-                s3_uri = inputs[param_name]
-                if not await acl_service.can_read(user_id, s3_uri):
-                    logger.error(f"[{request_id}] User {user_id} lacks read permission for {s3_uri}")
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail=f"Permission denied for file: {s3_uri}"
-                    )
+        param_name = param.get("name")
+        param_required = param.get("required", True)
+        param_type = param.get("type", "string")
+        
+        if param_name not in inputs:
+            if param_required:
+                logger.error("[%s] Missing required parameter: %s", request_id, param_name)
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Missing required parameter: {param_name}"
+                )
+            continue
+        
+        value = inputs[param_name]
+        
+        # 收集需要权限检查的 InputFile
+        if param_type == "InputFile":
+            s3_uris.append(value)
+            continue
+        
+        # 简化的类型检查
+        expected_type = _TYPE_CHECKS.get(param_type)
+        if expected_type and not isinstance(value, expected_type):
+            logger.error(
+                "[%s] Type mismatch for %s: expected %s, got %s",
+                request_id, param_name, param_type, type(value)
+            )
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Type mismatch for parameter {param_name}: expected {param_type}"
+            )
+    
+    if not s3_uris:
+        return
+    
+    # ACL 检查是纯内存操作，直接使用同步接口
+    for s3_uri in s3_uris:
+        if not acl_service.can_read_nowait(user_id, s3_uri):
+            logger.error("[%s] User %s lacks read permission for %s", request_id, user_id, s3_uri)
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Permission denied for file: {s3_uri}"
+            )
 
 
 async def resolve_secrets(
@@ -231,15 +348,22 @@ async def resolve_secrets(
     """解析函数所需的所有密钥"""
     resolved_secrets = {}
     secrets = function_def.get("secrets", [])
+    if not secrets:
+        return resolved_secrets
+    
+    # 一次查询取回全部密钥（每个调用使用独立会话，避免并发调用共享会话）
+    secret_names = [secret.get("name") for secret in secrets]
+    async with AsyncSessionLocal() as db:
+        secret_values = await vault_service.get_secrets_bulk(user_id, prefab_id, secret_names, db)
     
     for secret in secrets:
         secret_name = secret.get("name")
         secret_required = secret.get("required", True)
         
-        secret_value = await vault_service.get_secret(user_id, prefab_id, secret_name)
+        secret_value = secret_values.get(secret_name)
         
         if secret_value is None and secret_required:
-            logger.error(f"[{request_id}] Required secret not configured: {secret_name}")
+            logger.error("[%s] Required secret not configured: %s", request_id, secret_name)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Secret '{secret_name}' for prefab '{prefab_id}' is not configured"
@@ -247,12 +371,13 @@ async def resolve_secrets(
         
         if secret_value:
             resolved_secrets[secret_name] = secret_value
-            logger.debug(f"[{request_id}] Resolved secret: {secret_name}")
+            logger.debug("[%s] Resolved secret: %s", request_id, secret_name)
     
     return resolved_secrets
 
 
 async def invoke_knative_service(
+    client: httpx.AsyncClient,
     prefab_id: str,
     version: str,
     function_name: str,
@@ -264,35 +389,38 @@ async def invoke_knative_service(
     service_url = f"http://{prefab_id}.{settings.knative_namespace}.{settings.knative_domain_suffix}"
     endpoint_url = f"{service_url}/invoke/{function_name}"
     
-    logger.info(f"[{request_id}] Invoking: {endpoint_url}")
+    logger.info("[%s] Invoking: %s", request_id, endpoint_url)
     
-    async with httpx.AsyncClient(timeout=settings.http_timeout) as client:
-        try:
-            response = await client.post(endpoint_url, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.debug(f"[{request_id}] Knative response: {result}")
-            return result
-            
-        except httpx.HTTPStatusError as e:
-            logger.error(f"[{request_id}] Knative service returned error {e.response.status_code}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Downstream service error: {e.response.status_code}"
-            )
-        except httpx.TimeoutException:
-            logger.error(f"[{request_id}] Knative service timeout")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Downstream service timeout"
-            )
-        except Exception as e:
-            logger.error(f"[{request_id}] Failed to invoke Knative service: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Failed to invoke service: {str(e)}"
-            )
+    try:
+        response = await client.post(
+            endpoint_url,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        
+        result = orjson.loads(response.content)
+        logger.debug("[%s] Knative response: %s", request_id, result)
+        return result
+        
+    except httpx.HTTPStatusError as e:
+        logger.error("[%s] Knative service returned error %s", request_id, e.response.status_code)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Downstream service error: {e.response.status_code}"
+        )
+    except httpx.TimeoutException:
+        logger.error("[%s] Knative service timeout", request_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Downstream service timeout"
+        )
+    except Exception as e:
+        logger.error("[%s] Failed to invoke Knative service: %s", request_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Failed to invoke service: {str(e)}"
+        )
 
 
 async def handle_output_files(
@@ -302,12 +430,12 @@ async def handle_output_files(
     request_id: str
 ) -> None:
     """处理 OutputFile 类型的输出，授予用户所有权"""
-    returns = function_def.get("returns", {})
-    properties = returns.get("properties", {})
-    
-    for field_name, field_def in properties.items():
-        if field_def.get("type") == "OutputFile" and field_name in output:
-            s3_uri = output[field_name]
-            await acl_service.grant_ownership(user_id, s3_uri)
-            logger.info(f"[{request_id}] Granted ownership: user={user_id}, file={s3_uri}")
+    s3_uris = [
+        output[field_name]
+        for field_name in spec_cache_service.output_file_fields(function_def)
+        if field_name in output
+    ]
+    if s3_uris:
+        acl_service.grant_ownership_many_nowait(user_id, s3_uris)
+        logger.info("[%s] Granted ownership: user=%s, files=%s", request_id, user_id, s3_uris)
 
@@ -40,7 +40,7 @@ async def store_secret(
         db=db
     )
     
-    logger.info(f"User {user.user_id} stored secret {payload.secret_name} for prefab {payload.prefab_id}")
+    logger.info("User %s stored secret %s for prefab %s", user.user_id, payload.secret_name, payload.prefab_id)
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -103,7 +103,7 @@ async def delete_secret(
     """
     await vault_service.delete_secret(user.user_id, prefab_id, secret_name, db)
     
-    logger.info(f"User {user.user_id} deleted secret {secret_name} for prefab {prefab_id}")
+    logger.info("User %s deleted secret %s for prefab %s", user.user_id, secret_name, prefab_id)
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -2,14 +2,22 @@
 Webhook 路由 - 接收来自 prefab-factory 的通知
 """
 import logging
-import hashlib
 import hmac
+import orjson
+from functools import lru_cache
 from typing import Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from cachetools import TTLCache
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.hmac import HMAC
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Request, Response, status
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.session import get_db
+from db.session import AsyncSessionLocal, get_db, get_readonly_db
 from db.models import WebhookEvent, DeploymentStatus
+from models.requests import FactoryWebhookPayload
 from services.spec_cache_service import spec_cache_service
 from config.settings import settings
 
@@ -17,6 +25,44 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
+# 最近已处理的事件 ID（进程内去重，拦截 factory 的突发重试，无需查询数据库）
+_processed_events: TTLCache[str, bool] = TTLCache(maxsize=10000, ttl=300)
+
+# 按 event_id 查询的固定语句（模块级构造一次，SQLAlchemy 编译缓存按语句结构命中）
+_STMT_EVENT_PROCESSED = select(WebhookEvent.processed).where(WebhookEvent.event_id == bindparam("event_id"))
+_STMT_EVENT_BY_ID = select(WebhookEvent).where(WebhookEvent.event_id == bindparam("event_id"))
+
+# 事件类型 -> 目标部署状态
+_STATUS_MAP: Dict[str, DeploymentStatus] = {
+    "deployment.success": DeploymentStatus.DEPLOYED,
+    "deployment.failed": DeploymentStatus.FAILED,
+}
+
+# 只记录、不变更部署状态的事件类型：重复处理无副作用，先处理再一次性写入已处理的事件记录，不做预先落库
+# （deployment.failed 会改写部署状态，必须经过预先落库与 processed 检查，避免旧事件重放覆盖新状态）
+_SINGLE_WRITE_EVENTS = frozenset({"deployment.started"})
+
+
+# HMAC-SHA256 摘要长度（字节）
+_SHA256_DIGEST_SIZE = hashes.SHA256.digest_size
+
+
+@lru_cache(maxsize=8)
+def _hmac_template(secret: str) -> HMAC:
+    """
+    获取已载入密钥的 HMAC-SHA256 上下文模板
+    
+    密钥填充与 ipad/opad 预计算只进行一次（配置的 WEBHOOK_SECRET 在模块加载时预热），
+    之后每个请求通过 copy() 复制 OpenSSL 上下文即可
+    
+    Args:
+        secret: 共享密钥
+    
+    Returns:
+        只用于 copy() 的 HMAC 上下文（不可直接 finalize）
+    """
+    return HMAC(secret.encode('utf-8'), hashes.SHA256())
+
 
 def verify_signature(payload: bytes, signature: str, secret: str) -> bool:
     """
@@ -33,24 +79,121 @@ def verify_signature(payload: bytes, signature: str, secret: str) -> bool:
     if not signature:
         return False
     
-    # 计算期望的签名
-    expected = hmac.new(
-        secret.encode('utf-8'),
-        payload,
-        hashlib.sha256
-    ).hexdigest()
+    try:
+        provided = bytes.fromhex(signature)
+    except ValueError:
+        return False
+    
+    # 长度不符的签名无需计算 HMAC
+    if len(provided) != _SHA256_DIGEST_SIZE:
+        return False
     
-    # 安全比较
-    return hmac.compare_digest(signature, expected)
+    # 计算期望的签名（经由 OpenSSL EVP，支持时使用 SHA-NI 加速）
+    mac = _hmac_template(secret).copy()
+    mac.update(payload)
+    expected = mac.finalize()
+    
+    # 安全比较（原始摘要字节）
+    return hmac.compare_digest(provided, expected)
+
+
+# 启动时预先计算配置密钥的 HMAC 上下文，首个 webhook 请求无需承担密钥扩展开销
+if settings.WEBHOOK_SECRET:
+    _hmac_template(settings.WEBHOOK_SECRET)
+
+
+async def _process_event(event_values: Dict[str, Any], payload: FactoryWebhookPayload) -> None:
+    """
+    处理 webhook 事件（后台任务）
+    
+    请求作用域的数据库会话在响应返回后已关闭，这里使用独立的会话
+    
+    Args:
+        event_values: 事件记录字段（含原始载荷字节）
+        payload: 已解析的事件载荷
+    """
+    event_id = event_values["event_id"]
+    event_type = event_values["event_type"]
+    prefab_id = event_values["prefab_id"]
+    version = event_values["version"]
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            # deployment.started 不对应任何状态变更，只记录事件
+            status_enum = _STATUS_MAP.get(event_type)
+            if status_enum is not None:
+                deployed = status_enum is DeploymentStatus.DEPLOYED
+                if deployed and not payload.manifest:
+                    logger.warning("No manifest in webhook payload for %s:%s", prefab_id, version)
+                
+                # 成功时保存服务地址与 manifest，失败时保存错误信息
+                success = await spec_cache_service.update_deployment_status(
+                    prefab_id=prefab_id,
+                    version=version,
+                    status=status_enum,
+                    db=db,
+                    knative_service_url=payload.knative_service_url if deployed else None,
+                    manifest=payload.manifest if deployed else None,
+                    error_message=None if deployed else (payload.error_message or "Unknown error")
+                )
+                
+                if success:
+                    logger.info("Updated spec deployment status: %s:%s → %s", prefab_id, version, status_enum.name)
+                else:
+                    logger.warning("Failed to update spec deployment status: %s:%s", prefab_id, version)
+            
+            # 标记事件为已处理（使用 upsert，即使业务处理中途回滚了事件记录也能补写）
+            stmt = mysql_insert(WebhookEvent).values(
+                **event_values, processed=True, processed_at=func.now(), retry_count=0
+            )
+            if event_type in _SINGLE_WRITE_EVENTS:
+                # 未预先落库，重复投递在此计入重试次数（须在 processed 被覆盖前求值）
+                stmt = stmt.on_duplicate_key_update([
+                    ("retry_count", WebhookEvent.retry_count + func.if_(WebhookEvent.processed, 0, 1)),
+                    ("processed", True),
+                    ("processed_at", func.now()),
+                ])
+            else:
+                stmt = stmt.on_duplicate_key_update(processed=True, processed_at=func.now())
+            await db.execute(stmt)
+            await db.commit()
+            _processed_events[event_id] = True
+        
+        except Exception as e:
+            logger.error("Error processing webhook event %s: %s", event_id, e)
+            # 记录失败原因；数据库本身不可用时这里也会失败，只记录日志，不在后台任务中继续抛出
+            try:
+                await db.rollback()
+                stmt = mysql_insert(WebhookEvent).values(
+                    **event_values, processed=False, processing_error=str(e), retry_count=1
+                )
+                stmt = stmt.on_duplicate_key_update(
+                    processing_error=str(e),
+                    retry_count=WebhookEvent.retry_count + 1
+                )
+                await db.execute(stmt)
+                await db.commit()
+            except Exception:
+                logger.exception("Failed to record processing error for webhook event %s", event_id)
 
 
 @router.post(
     "/factory",
+    status_code=status.HTTP_202_ACCEPTED,
     summary="接收 Factory 部署通知",
-    description="Prefab Factory 在部署完成后调用此端点通知 Gateway"
+    description="Prefab Factory 在部署完成后调用此端点通知 Gateway",
+    # 请求体在签名校验后手动解析，需要显式声明 OpenAPI 文档中的请求体结构
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": FactoryWebhookPayload.model_json_schema()}}
+        }
+    }
 )
 async def receive_factory_webhook(
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     x_webhook_signature: str = Header(None, alias="X-Webhook-Signature"),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
@@ -79,129 +222,86 @@ async def receive_factory_webhook(
     body = await request.body()
     
     # 验证签名（如果配置了 webhook secret）
-    webhook_secret = getattr(settings, 'WEBHOOK_SECRET', None)
-    if webhook_secret:
-        if not verify_signature(body, x_webhook_signature or "", webhook_secret):
+    if settings.WEBHOOK_SECRET:
+        if not verify_signature(body, x_webhook_signature or "", settings.WEBHOOK_SECRET):
             logger.warning("Invalid webhook signature")
             raise HTTPException(status_code=401, detail="Invalid signature")
     
-    # 解析 JSON
+    # 解析并校验载荷（pydantic-core 直接从已读取的请求体字节解析）
     try:
-        payload = await request.json()
-    except Exception as e:
-        logger.error(f"Failed to parse webhook payload: {e}")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
-    
-    # 提取事件信息
-    event_id = payload.get("event_id")
-    event_type = payload.get("event_type")
-    prefab_id = payload.get("prefab_id")
-    version = payload.get("version")
-    knative_service_url = payload.get("knative_service_url")
-    deployment_status_str = payload.get("deployment_status")
-    
-    if not all([event_id, event_type, prefab_id, version]):
+        payload = FactoryWebhookPayload.model_validate_json(body)
+    except ValidationError as e:
+        logger.error("Invalid webhook payload: %s", e)
         raise HTTPException(
             status_code=400,
-            detail="Missing required fields: event_id, event_type, prefab_id, version"
+            detail=[
+                {"loc": error["loc"], "msg": error["msg"], "type": error["type"]}
+                for error in e.errors(include_url=False)
+            ]
         )
     
+    # 提取事件信息
+    event_id = payload.event_id
+    event_type = payload.event_type
+    prefab_id = payload.prefab_id
+    version = payload.version
+    
     logger.info(
-        f"Received webhook: event_id={event_id}, type={event_type}, "
-        f"prefab={prefab_id}:{version}"
+        "Received webhook: event_id=%s, type=%s, prefab=%s:%s",
+        event_id, event_type, prefab_id, version
     )
     
-    # 检查事件是否已处理（幂等性）
-    from sqlalchemy import select
-    stmt = select(WebhookEvent).where(WebhookEvent.event_id == event_id)
-    result = await db.execute(stmt)
-    existing = result.scalar_one_or_none()
-    
-    if existing:
-        if existing.processed:
-            logger.info(f"Webhook event already processed: {event_id}")
-            return {
-                "status": "already_processed",
-                "event_id": event_id
-            }
-        else:
-            logger.warning(f"Webhook event exists but not processed: {event_id}")
-    else:
-        # 创建新的 webhook 事件记录
-        new_event = WebhookEvent(
-            event_id=event_id,
-            source="factory",
-            event_type=event_type,
-            prefab_id=prefab_id,
-            version=version,
-            payload=payload,
-            signature=x_webhook_signature
-        )
-        db.add(new_event)
-        await db.commit()
-        await db.refresh(new_event)
-        existing = new_event
-    
-    # 处理事件
-    try:
-        if event_type == "deployment.success":
-            # 获取 manifest 数据（从 payload 中）
-            manifest = payload.get("manifest")
-            if not manifest:
-                logger.warning(f"No manifest in webhook payload for {prefab_id}:{version}")
-            
-            # 更新部署状态为 DEPLOYED，保存 manifest
-            success = await spec_cache_service.update_deployment_status(
-                prefab_id=prefab_id,
-                version=version,
-                status=DeploymentStatus.DEPLOYED,
-                db=db,
-                knative_service_url=knative_service_url,
-                manifest=manifest
-            )
-            
-            if success:
-                logger.info(f"Updated spec deployment status: {prefab_id}:{version} → DEPLOYED")
-            else:
-                logger.warning(f"Failed to update spec deployment status: {prefab_id}:{version}")
-        
-        elif event_type == "deployment.failed":
-            # 获取失败原因
-            error_message = payload.get("error_message", "Unknown error")
-            
-            # 更新部署状态为 FAILED，保存错误信息
-            await spec_cache_service.update_deployment_status(
-                prefab_id=prefab_id,
-                version=version,
-                status=DeploymentStatus.FAILED,
-                db=db,
-                error_message=error_message
-            )
-            logger.info(f"Updated spec deployment status: {prefab_id}:{version} → FAILED: {error_message}")
-        
-        # 标记事件为已处理
-        existing.processed = True
-        existing.processed_at = None  # SQLAlchemy will set this
-        await db.commit()
-        
+    if event_id in _processed_events:
+        logger.info("Webhook event already processed (cached): %s", event_id)
+        response.status_code = status.HTTP_200_OK
         return {
-            "status": "processed",
-            "event_id": event_id,
-            "event_type": event_type,
-            "prefab_id": prefab_id,
-            "version": version
+            "status": "already_processed",
+            "event_id": event_id
         }
+    
+    event_values = {
+        "event_id": event_id,
+        "source": "factory",
+        "event_type": event_type,
+        "prefab_id": prefab_id,
+        "version": version,
+        "payload_raw": body,  # 原样保存签名覆盖的字节，无需重新序列化
+        "signature": x_webhook_signature,
+    }
+    
+    # 可安全重试的事件无需预先落库做幂等检查，由后台任务处理完成后一次性写入
+    if event_type not in _SINGLE_WRITE_EVENTS:
+        # 记录事件并检查幂等性（单条 INSERT ... ON DUPLICATE KEY UPDATE）
+        # MySQL 约定：rowcount 为 1 表示新插入，为 2 表示已存在的记录被更新
+        stmt = mysql_insert(WebhookEvent).values(**event_values, processed=False, retry_count=0)
+        stmt = stmt.on_duplicate_key_update(retry_count=WebhookEvent.retry_count + 1)
+        result = await db.execute(stmt)
         
-    except Exception as e:
-        logger.error(f"Error processing webhook event: {e}")
-        existing.processing_error = str(e)
-        existing.retry_count += 1
-        await db.commit()
+        if result.rowcount != 1:
+            processed = await db.scalar(_STMT_EVENT_PROCESSED, {"event_id": event_id})
+            if processed:
+                await db.commit()
+                _processed_events[event_id] = True
+                logger.info("Webhook event already processed: %s", event_id)
+                response.status_code = status.HTTP_200_OK
+                return {
+                    "status": "already_processed",
+                    "event_id": event_id
+                }
+            logger.warning("Webhook event exists but not processed: %s", event_id)
         
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to process webhook: {str(e)}"
-        )
+        # 提交事件记录后立即以 202 确认，部署状态更新（MySQL + Redis）在响应发出后的后台任务中完成
+        await db.commit()
+    
+    background_tasks.add_task(_process_event, event_values, payload)
+    
+    return {
+        "status": "accepted",
+        "event_id": event_id,
+        "event_type": event_type,
+        "prefab_id": prefab_id,
+        "version": version
+    }
 
 
 @router.get(
@@ -210,13 +310,10 @@ async def receive_factory_webhook(
 )
 async def get_webhook_event(
     event_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_readonly_db)
 ) -> Dict[str, Any]:
     """查询特定 webhook 事件的处理状态"""
-    from sqlalchemy import select
-    
-    stmt = select(WebhookEvent).where(WebhookEvent.event_id == event_id)
-    result = await db.execute(stmt)
+    result = await db.execute(_STMT_EVENT_BY_ID, {"event_id": event_id})
     event = result.scalar_one_or_none()
     
     if not event:
@@ -232,6 +329,7 @@ async def get_webhook_event(
         "processed_at": event.processed_at.isoformat() if event.processed_at else None,
         "retry_count": event.retry_count,
         "processing_error": event.processing_error,
+        "payload": orjson.loads(event.payload_raw),
         "created_at": event.created_at.isoformat()
     }
 
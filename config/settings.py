@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     # 服务器配置
     host: str = "0.0.0.0"
     port: int = 8000
+    workers: int = 1  # uvicorn 工作进程数
     
     # JWT 配置
     jwt_secret_key: str = "your-secret-key-change-in-production"
@@ -28,15 +29,22 @@ class Settings(BaseSettings):
     DB_USER: str = "prefab_gateway"
     DB_PASSWORD: str = "change-me-in-production"
     DB_NAME: str = "prefab_gateway"
+    DB_POOL_SIZE: int = 20  # 连接池常驻连接数
+    DB_MAX_OVERFLOW: int = 40  # 突发时允许额外创建的连接数
+    DB_POOL_RECYCLE: int = 1800  # 连接回收时间（秒）
+    AUDIT_LOG_RETENTION_MONTHS: int = 6  # 审计日志保留月数（按月分区删除）
     
     # 数据加密配置（用于加密用户密钥）
     ENCRYPTION_KEY: str = "your-32-byte-encryption-key-change-in-production"  # 至少 32 字节
+    USE_RFERNET: bool = True  # 已安装 rfernet 时使用其 Rust 实现的 Fernet（与 cryptography 格式兼容）
+    SECRET_CIPHER: str = "aesgcm"  # 新写入密钥使用的算法：aesgcm 或 fernet（两种密文都可解密）
     
     # Redis 配置（用于 SpecCache）
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_db: int = 0
     redis_password: Optional[str] = None
+    redis_max_connections: int = 64  # 连接池最大连接数（每个 worker 进程）
     
     # 密钥保管库配置
     vault_url: Optional[str] = None  # 如果为 None，使用内存模拟
@@ -52,16 +60,23 @@ class Settings(BaseSettings):
     # Webhook 配置
     WEBHOOK_SECRET: Optional[str] = None  # 用于验证来自 factory 的 webhook 签名
     
+    # 执行引擎配置
+    max_parallel_calls: int = 10  # 单个 /v1/run 请求内并发执行的调用数上限
+    
     # HTTP 客户端配置
     http_timeout: int = 30  # 秒
     http_max_retries: int = 2
+    http_max_connections: int = 200  # 共享连接池的最大连接数
+    http_max_keepalive_connections: int = 100  # 保持活跃的空闲连接数
     
     # 文件处理和 S3 配置
     workspace_root: str = "/mnt/prefab-workspace"  # PVC 挂载路径
+    workspace_cleanup_measure_size: bool = True  # 清理时统计释放的磁盘空间（仅用于日志）
     s3_bucket: str = "prefab-outputs"  # S3 存储桶名称（用于上传 OutputFile）
     s3_prefix: str = ""  # S3 路径前缀（用于共享存储桶时区分项目，如 "gtplanner/"）
     s3_region: Optional[str] = None  # S3 区域（默认使用环境变量 AWS_REGION）
     s3_endpoint_url: Optional[str] = None  # S3 自定义 endpoint（用于阿里云 OSS 等 S3 兼容存储）
+    s3_max_concurrency: int = 16  # 同时进行的 S3 传输数上限（进程级）
     
     # 日志配置
     log_level: str = "INFO"
@@ -1,38 +1,71 @@
 """数据库模型定义"""
 from datetime import datetime
+from typing import Any, Optional
 from sqlalchemy import (
     Column, String, Text, Integer, Boolean, DateTime,
-    Index, JSON, Enum as SQLEnum
+    Index, JSON, LargeBinary
 )
+from sqlalchemy.dialects.mysql import TINYINT
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from db.base import Base
 import enum
 
 
-class SecretStatus(enum.Enum):
-    """密钥状态"""
-    ACTIVE = "active"
-    DISABLED = "disabled"
-    EXPIRED = "expired"
+class SecretStatus(enum.IntEnum):
+    """密钥状态（数据库中以 TINYINT 存储）"""
+    ACTIVE = 1
+    DISABLED = 2
+    EXPIRED = 3
+    
+    @property
+    def label(self) -> str:
+        """对外展示的状态名（如 "active"）"""
+        return self.name.lower()
+
+
+class DeploymentStatus(enum.IntEnum):
+    """部署状态（数据库中以 TINYINT 存储）"""
+    DEPLOYED = 1  # 部署成功，可调用
+    FAILED = 2    # 部署失败
+    
+    @property
+    def label(self) -> str:
+        """对外展示的状态名（如 "deployed"）"""
+        return self.name.lower()
 
 
-class DeploymentStatus(enum.Enum):
-    """部署状态"""
-    DEPLOYED = "deployed"  # 部署成功，可调用
-    FAILED = "failed"      # 部署失败
+class IntEnumType(TypeDecorator):
+    """
+    将 IntEnum 存储为 TINYINT UNSIGNED 的列类型
+    
+    读写时在 Python 侧完成整数与枚举成员的转换，避免 MySQL ENUM 的字符串比较
+    """
+    impl = TINYINT(unsigned=True)
+    cache_ok = True
+    
+    def __init__(self, enum_class: type[enum.IntEnum], **kwargs: Any):
+        super().__init__(**kwargs)
+        self.enum_class = enum_class
+    
+    def process_bind_param(self, value: Optional[int], dialect: Any) -> Optional[int]:
+        return None if value is None else int(value)
+    
+    def process_result_value(self, value: Optional[int], dialect: Any) -> Optional[enum.IntEnum]:
+        return None if value is None else self.enum_class(value)
 
 
 class UserSecret(Base):
     """用户密钥表 - 加密存储用户的 API Key 等敏感信息"""
     __tablename__ = "user_secrets"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String(64), nullable=False, index=True, comment="用户 ID")
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False, comment="用户 ID")
     prefab_id = Column(String(128), nullable=False, index=True, comment="预制件 ID（如 weather-api-v1）")
     secret_name = Column(String(128), nullable=False, comment="密钥名称（如 API_KEY）")
-    secret_value = Column(Text, nullable=False, comment="加密后的密钥值")
+    secret_value = Column(LargeBinary, nullable=False, comment="加密后的密钥值（二进制密文）")
     encryption_key_id = Column(String(64), nullable=True, comment="加密密钥 ID（用于密钥轮转）")
-    status = Column(SQLEnum(SecretStatus), default=SecretStatus.ACTIVE, nullable=False)
+    status = Column(IntEnumType(SecretStatus), default=SecretStatus.ACTIVE, nullable=False, comment="密钥状态")
     
     # 元数据
     description = Column(String(255), nullable=True, comment="密钥描述")
@@ -44,6 +77,8 @@ class UserSecret(Base):
     # 复合索引
     __table_args__ = (
         Index('idx_user_prefab_secret', 'user_id', 'prefab_id', 'secret_name', unique=True),
+        # 覆盖 list_secrets：按 user_id + status（+ prefab_id）过滤，只读取 prefab_id / secret_name
+        Index('idx_user_status_prefab_secret', 'user_id', 'status', 'prefab_id', 'secret_name'),
         Index('idx_status', 'status'),
         {'comment': '用户密钥表'}
     )
@@ -53,14 +88,14 @@ class PrefabSpec(Base):
     """预制件规格表 - 缓存预制件的 manifest.json"""
     __tablename__ = "prefab_specs"
 
-    id = Column(Integer, primary_key=True, index=True)
-    prefab_id = Column(String(128), nullable=False, index=True, comment="预制件 ID")
-    version = Column(String(32), nullable=False, index=True, comment="版本号")
+    id = Column(Integer, primary_key=True)
+    prefab_id = Column(String(128), nullable=False, comment="预制件 ID")
+    version = Column(String(32), nullable=False, comment="版本号")
     spec_json = Column(JSON, nullable=False, comment="完整的 manifest.json 内容")
     
     # 部署信息
     knative_service_url = Column(String(512), nullable=True, comment="Knative 服务地址")
-    deployment_status = Column(SQLEnum(DeploymentStatus), nullable=False, comment="部署状态")
+    deployment_status = Column(IntEnumType(DeploymentStatus), nullable=False, comment="部署状态")
     deployment_error = Column(Text, nullable=True, comment="部署失败原因")
     
     # 元数据
@@ -76,7 +111,7 @@ class PrefabSpec(Base):
 
     __table_args__ = (
         Index('idx_prefab_version', 'prefab_id', 'version', unique=True),
-        Index('idx_deployment_status', 'deployment_status'),
+        Index('idx_status_updated', 'deployment_status', 'updated_at'),
         {'comment': '预制件规格表'}
     )
 
@@ -85,9 +120,9 @@ class AuditLog(Base):
     """审计日志表 - 记录所有重要操作"""
     __tablename__ = "audit_logs"
 
-    id = Column(Integer, primary_key=True, index=True)
-    request_id = Column(String(64), index=True, comment="请求 ID")
-    user_id = Column(String(64), nullable=False, index=True, comment="用户 ID")
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    request_id = Column(String(64), comment="请求 ID")
+    user_id = Column(String(64), nullable=False, comment="用户 ID")
     
     # 操作信息
     action = Column(String(64), nullable=False, index=True, comment="操作类型（run, create_secret, delete_secret 等）")
@@ -107,12 +142,15 @@ class AuditLog(Base):
     
     # 元数据
     extra_metadata = Column(JSON, nullable=True, comment="额外的元数据（JSON）")
-    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+    # created_at 属于主键：表按 created_at 按月 RANGE 分区，MySQL 要求分区列包含在主键中
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, primary_key=True, index=True)
     duration_ms = Column(Integer, nullable=True, comment="处理耗时（毫秒）")
 
     __table_args__ = (
         Index('idx_user_action_time', 'user_id', 'action', 'created_at'),
         Index('idx_request', 'request_id'),
+        # 分区：PARTITION BY RANGE (TO_DAYS(created_at))，每月一个分区
+        # 由迁移 b8d05e2dac02 创建，`db-rotate-partitions` 负责追加新分区与按保留期删除旧分区
         {'comment': '审计日志表'}
     )
 
@@ -121,18 +159,18 @@ class WebhookEvent(Base):
     """Webhook 事件表 - 记录来自 prefab-factory 的通知"""
     __tablename__ = "webhook_events"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     event_id = Column(String(64), unique=True, nullable=False, index=True, comment="事件 ID（幂等性）")
     source = Column(String(64), nullable=False, comment="事件来源（factory, github 等）")
     event_type = Column(String(64), nullable=False, index=True, comment="事件类型（deployment.success, deployment.failed 等）")
     
     # 事件数据
-    prefab_id = Column(String(128), nullable=True, index=True, comment="预制件 ID")
+    prefab_id = Column(String(128), nullable=True, comment="预制件 ID")
     version = Column(String(32), nullable=True, comment="版本号")
-    payload = Column(JSON, nullable=False, comment="完整的事件载荷")
+    payload_raw = Column(LargeBinary(length=16777215), nullable=False, comment="原始事件载荷（签名覆盖的请求体字节）")
     
     # 处理状态
-    processed = Column(Boolean, default=False, nullable=False, index=True, comment="是否已处理")
+    processed = Column(Boolean, default=False, nullable=False, comment="是否已处理")
     processed_at = Column(DateTime, nullable=True, comment="处理时间")
     processing_error = Column(Text, nullable=True, comment="处理错误信息")
     retry_count = Column(Integer, default=0, comment="重试次数")
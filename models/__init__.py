@@ -1,15 +1,23 @@
 """数据模型"""
-from .requests import PrefabInput, PrefabCall, RunRequestPayload, SecretPayload
-from .responses import CallResult, CallStatus, RunResponsePayload, ErrorResponse
+from .requests import (
+    PrefabInput, PrefabCall, RunRequestPayload, SecretPayload, FactoryWebhookPayload,
+    PrefabCallStruct, RunRequestStruct
+)
+from .responses import CallResult, CallStatus, RunResponsePayload, ErrorResponse, CallResultStruct, RunResponseStruct
 
 __all__ = [
     "PrefabInput",
     "PrefabCall",
     "RunRequestPayload",
     "SecretPayload",
+    "FactoryWebhookPayload",
+    "PrefabCallStruct",
+    "RunRequestStruct",
     "CallResult",
     "CallStatus",
     "RunResponsePayload",
     "ErrorResponse",
+    "CallResultStruct",
+    "RunResponseStruct",
 ]
 
@@ -1,8 +1,9 @@
 """
 请求模型定义
 """
+import msgspec
 from pydantic import BaseModel, Field
-from typing import Any, Dict
+from typing import Any, Dict, Literal, Optional
 
 
 class PrefabInput(BaseModel):
@@ -65,6 +66,26 @@ class RunRequestPayload(BaseModel):
         }
 
 
+class PrefabCallStruct(msgspec.Struct):
+    """
+    单个预制件调用请求（msgspec 版本）
+    
+    /v1/run 热路径上直接由 msgspec 从原始字节解码，字段与 PrefabCall 保持一致；
+    PrefabCall 仅用于生成 OpenAPI 文档
+    """
+    prefab_id: str
+    version: str
+    function_name: str
+    inputs: Dict[str, Any] = msgspec.field(default_factory=dict)
+
+
+class RunRequestStruct(msgspec.Struct):
+    """
+    /v1/run 端点的请求体（msgspec 版本，对应 RunRequestPayload）
+    """
+    calls: list[PrefabCallStruct]
+
+
 class SecretPayload(BaseModel):
     """
     密钥配置请求体
@@ -82,3 +103,30 @@ class SecretPayload(BaseModel):
             }
         }
 
+
+class FactoryWebhookPayload(BaseModel):
+    """
+    prefab-factory 部署通知的 webhook 载荷
+    """
+    event_id: str = Field(..., min_length=1, description="事件 ID（幂等性）", example="deploy-123")
+    event_type: Literal["deployment.success", "deployment.failed", "deployment.started"] = Field(
+        ..., description="事件类型"
+    )
+    prefab_id: str = Field(..., min_length=1, description="预制件 ID", example="weather-api-v1")
+    version: str = Field(..., min_length=1, description="版本号", example="1.0.0")
+    knative_service_url: Optional[str] = Field(None, description="Knative 服务地址")
+    deployment_status: Optional[str] = Field(None, description="部署状态")
+    manifest: Optional[Dict[str, Any]] = Field(None, description="完整的 manifest.json（deployment.success 时）")
+    error_message: Optional[str] = Field(None, description="失败原因（deployment.failed 时）")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "event_id": "deploy-123",
+                "event_type": "deployment.success",
+                "prefab_id": "weather-api-v1",
+                "version": "1.0.0",
+                "knative_service_url": "http://weather-api-v1.prefab.svc.cluster.local",
+                "deployment_status": "deployed"
+            }
+        }
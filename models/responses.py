@@ -1,6 +1,7 @@
 """
 响应模型定义
 """
+import msgspec
 from pydantic import BaseModel, Field
 from typing import Any, Dict, Optional
 from enum import Enum
@@ -61,6 +62,26 @@ class RunResponsePayload(BaseModel):
         }
 
 
+class CallResultStruct(msgspec.Struct):
+    """
+    单个调用结果（msgspec 版本，对应 CallResult）
+    """
+    status: CallStatus
+    output: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+
+
+class RunResponseStruct(msgspec.Struct):
+    """
+    /v1/run 端点的响应体（msgspec 版本，对应 RunResponsePayload）
+    
+    由 msgspec 直接编码为 JSON 字节；RunResponsePayload 仅用于生成 OpenAPI 文档
+    """
+    job_id: str
+    status: str
+    results: list[CallResultStruct]
+
+
 class ErrorResponse(BaseModel):
     """
     错误响应
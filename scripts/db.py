@@ -1,6 +1,8 @@
 """数据库管理脚本"""
 import sys
 import os
+import re
+from datetime import date
 from pathlib import Path
 
 # 将项目根目录添加到 Python 路径
@@ -9,6 +11,8 @@ sys.path.insert(0, str(project_root))
 
 from alembic.config import Config
 from alembic import command
+from sqlalchemy import text
+from config.settings import settings
 from db.session import sync_engine
 from db.base import Base
 import db.models  # noqa 导入所有模型以便 Base.metadata 能找到它们
@@ -67,6 +71,52 @@ def downgrade():
         sys.exit(1)
 
 
+def _add_months(day: date, months: int) -> date:
+    """返回 day 所在月份偏移 months 个月后的当月 1 日"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def rotate_partitions():
+    """维护 audit_logs 的按月分区（追加下月分区，删除超出保留期的分区）"""
+    print("🔧 维护 audit_logs 分区...")
+    try:
+        this_month = date.today().replace(day=1)
+        with sync_engine.begin() as conn:
+            existing = set(conn.execute(text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_logs' "
+                "AND PARTITION_NAME IS NOT NULL"
+            )).scalars())
+            if "pmax" not in existing:
+                print("⚠️ audit_logs 未分区，请先执行 db-upgrade")
+                return
+            
+            # 从 pmax 中拆分出当月与下月分区
+            for offset in (0, 1):
+                month = _add_months(this_month, offset)
+                name = f"p{month:%Y%m}"
+                if name in existing:
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE audit_logs REORGANIZE PARTITION pmax INTO ("
+                    f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{_add_months(month, 1):%Y-%m-%d}')), "
+                    f"PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                ))
+                print(f"  + {name}")
+            
+            # 删除超出保留期的分区（DROP PARTITION 远快于 DELETE）
+            cutoff = f"p{_add_months(this_month, -settings.AUDIT_LOG_RETENTION_MONTHS):%Y%m}"
+            for name in sorted(existing):
+                if re.fullmatch(r"p\d{6}", name) and name < cutoff:
+                    conn.execute(text(f"ALTER TABLE audit_logs DROP PARTITION {name}"))
+                    print(f"  - {name}")
+        print("✅ 分区维护完成！")
+    except Exception as e:
+        print(f"❌ 分区维护失败: {e}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         action = sys.argv[1]
@@ -78,9 +128,11 @@ if __name__ == "__main__":
             upgrade()
         elif action == "downgrade":
             downgrade()
+        elif action == "rotate-partitions":
+            rotate_partitions()
         else:
             print(f"未知操作: {action}")
-            print("可用操作: init, migrate, upgrade, downgrade")
+            print("可用操作: init, migrate, upgrade, downgrade, rotate-partitions")
             sys.exit(1)
     else:
         print("用法: python scripts/db.py <action>")
@@ -89,4 +141,5 @@ if __name__ == "__main__":
         print("  migrate   - 生成迁移脚本")
         print("  upgrade   - 应用迁移（升级）")
         print("  downgrade - 回滚迁移（降级）")
+        print("  rotate-partitions - 维护审计日志分区（建议每日定时执行）")
 
@@ -10,6 +10,8 @@ def dev():
         "app.main:app",
         host=settings.host,
         port=settings.port,
+        loop="uvloop",
+        http="httptools",
         reload=True,
         log_level="debug"
     )
@@ -21,6 +23,8 @@ def start():
         "app.main:app",
         host=settings.host,
         port=settings.port,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
 
@@ -31,6 +35,8 @@ def prod():
         "app.main:app",
         host=settings.host,
         port=settings.port,
+        loop="uvloop",
+        http="httptools",
         workers=4,
         log_level="warning"
     )
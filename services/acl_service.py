@@ -4,7 +4,9 @@
 负责验证用户对 S3 资源的访问权限
 """
 import logging
-from typing import Set
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Set
+from cachetools import TTLCache
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -18,12 +20,23 @@ class AccessControlService:
     生产环境应该集成真实的 ACL 系统
     """
     
+    # 用户不存在时的共享空集合，避免每次未命中都分配新的 set()
+    _EMPTY: FrozenSet[str] = frozenset()
+    
     def __init__(self) -> None:
         # 内存存储: {user_id: set(s3_uris)}
         self._user_files: dict[str, Set[str]] = {}
+        # 反向索引: {s3_uri: set(user_ids)}，与正向索引同步维护
+        self._file_users: dict[str, Set[str]] = {}
+        # 权限检查结果缓存，按 (user_id, s3_uri) 记忆；授权变更时整体清空
+        self._check_cache = lru_cache(maxsize=8192)(self._check_impl)
+        # 拒绝结果的短期负缓存，命中时直接返回 False（不再记录日志）
+        self._neg: TTLCache = TTLCache(maxsize=10_000, ttl=60)
         logger.info("AccessControlService initialized (in-memory mode)")
     
-    async def can_read(self, user_id: str, s3_uri: str) -> bool:
+    # ---- 同步接口（纯内存操作，可在事件循环中直接调用，无需 await）----
+    
+    def can_read_nowait(self, user_id: str, s3_uri: str) -> bool:
         """
         检查用户是否有权限读取指定的 S3 对象
         
@@ -34,17 +47,21 @@ class AccessControlService:
         Returns:
             True 如果有权限，False 否则
         """
-        user_files = self._user_files.get(user_id, set())
-        has_permission = s3_uri in user_files
+        key = (user_id, s3_uri)
+        if key in self._neg:
+            return False
+        
+        has_permission = self._check_cache(user_id, s3_uri)
         
         if has_permission:
-            logger.debug(f"User {user_id} has read permission for {s3_uri}")
+            logger.debug("User %s has read permission for %s", user_id, s3_uri)
         else:
-            logger.warning(f"User {user_id} does NOT have read permission for {s3_uri}")
+            self._neg[key] = True
+            logger.debug("User %s does NOT have read permission for %s", user_id, s3_uri)
         
         return has_permission
     
-    async def can_write(self, user_id: str, s3_uri: str) -> bool:
+    def can_write_nowait(self, user_id: str, s3_uri: str) -> bool:
         """
         检查用户是否有权限写入指定的 S3 对象
         
@@ -58,9 +75,13 @@ class AccessControlService:
         Returns:
             True 如果有权限，False 否则
         """
-        return await self.can_read(user_id, s3_uri)
+        return self.can_read_nowait(user_id, s3_uri)
     
-    async def grant_ownership(self, user_id: str, s3_uri: str) -> None:
+    def _check_impl(self, user_id: str, s3_uri: str) -> bool:
+        """直接查询内存存储（未缓存）"""
+        return s3_uri in (self._user_files.get(user_id) or self._EMPTY)
+    
+    def grant_ownership_nowait(self, user_id: str, s3_uri: str) -> None:
         """
         授予用户对 S3 对象的所有权
         
@@ -70,13 +91,32 @@ class AccessControlService:
             user_id: 用户 ID
             s3_uri: S3 URI
         """
-        if user_id not in self._user_files:
-            self._user_files[user_id] = set()
+        self._user_files.setdefault(user_id, set()).add(s3_uri)
+        self._file_users.setdefault(s3_uri, set()).add(user_id)
+        self._check_cache.cache_clear()
+        self._neg.pop((user_id, s3_uri), None)
+        logger.info("Granted ownership: user=%s, file=%s", user_id, s3_uri)
+    
+    def grant_ownership_many_nowait(self, user_id: str, s3_uris: Iterable[str]) -> None:
+        """
+        批量授予用户对多个 S3 对象的所有权
         
-        self._user_files[user_id].add(s3_uri)
-        logger.info(f"Granted ownership: user={user_id}, file={s3_uri}")
+        Args:
+            user_id: 用户 ID
+            s3_uris: S3 URI 列表
+        """
+        uris = s3_uris if isinstance(s3_uris, (list, tuple, set, frozenset)) else list(s3_uris)
+        if not uris:
+            return
+        
+        self._user_files.setdefault(user_id, set()).update(uris)
+        for s3_uri in uris:
+            self._file_users.setdefault(s3_uri, set()).add(user_id)
+            self._neg.pop((user_id, s3_uri), None)
+        self._check_cache.cache_clear()
+        logger.info("Granted ownership of %s files to user=%s", len(uris), user_id)
     
-    async def revoke_access(self, user_id: str, s3_uri: str) -> bool:
+    def revoke_access_nowait(self, user_id: str, s3_uri: str) -> bool:
         """
         撤销用户对 S3 对象的访问权限
         
@@ -89,11 +129,17 @@ class AccessControlService:
         """
         if user_id in self._user_files and s3_uri in self._user_files[user_id]:
             self._user_files[user_id].remove(s3_uri)
-            logger.info(f"Revoked access: user={user_id}, file={s3_uri}")
+            users = self._file_users.get(s3_uri)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._file_users[s3_uri]
+            self._check_cache.cache_clear()
+            logger.info("Revoked access: user=%s, file=%s", user_id, s3_uri)
             return True
         return False
     
-    async def list_user_files(self, user_id: str) -> list[str]:
+    def list_user_files_nowait(self, user_id: str) -> list[str]:
         """
         列出用户有权访问的所有文件
         
@@ -103,7 +149,49 @@ class AccessControlService:
         Returns:
             S3 URI 列表
         """
-        return list(self._user_files.get(user_id, set()))
+        return list(self._user_files.get(user_id) or self._EMPTY)
+    
+    def list_users_for_file_nowait(self, s3_uri: str) -> list[str]:
+        """
+        列出有权访问指定文件的所有用户
+        
+        Args:
+            s3_uri: S3 URI
+        
+        Returns:
+            用户 ID 列表
+        """
+        return list(self._file_users.get(s3_uri) or self._EMPTY)
+    
+    # ---- 异步接口（兼容现有调用方，直接返回同步结果）----
+    
+    async def can_read(self, user_id: str, s3_uri: str) -> bool:
+        """检查读权限，见 can_read_nowait"""
+        return self.can_read_nowait(user_id, s3_uri)
+    
+    async def can_write(self, user_id: str, s3_uri: str) -> bool:
+        """检查写权限，见 can_write_nowait"""
+        return self.can_write_nowait(user_id, s3_uri)
+    
+    async def grant_ownership(self, user_id: str, s3_uri: str) -> None:
+        """授予所有权，见 grant_ownership_nowait"""
+        self.grant_ownership_nowait(user_id, s3_uri)
+    
+    async def grant_ownership_many(self, user_id: str, s3_uris: Iterable[str]) -> None:
+        """批量授予所有权，见 grant_ownership_many_nowait"""
+        self.grant_ownership_many_nowait(user_id, s3_uris)
+    
+    async def revoke_access(self, user_id: str, s3_uri: str) -> bool:
+        """撤销访问权限，见 revoke_access_nowait"""
+        return self.revoke_access_nowait(user_id, s3_uri)
+    
+    async def list_user_files(self, user_id: str) -> list[str]:
+        """列出用户文件，见 list_user_files_nowait"""
+        return self.list_user_files_nowait(user_id)
+    
+    async def list_users_for_file(self, s3_uri: str) -> list[str]:
+        """列出文件的用户，见 list_users_for_file_nowait"""
+        return self.list_users_for_file_nowait(s3_uri)
 
 
 # 全局单例
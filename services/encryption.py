@@ -1,26 +1,108 @@
-"""密钥加密工具 - 使用 Fernet 对称加密"""
-from cryptography.fernet import Fernet
+"""密钥加密工具 - 使用 AES-GCM / Fernet 对称加密"""
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.hmac import HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import base64
 import hashlib
+import os
+import struct
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
 from config.settings import settings
 
+try:
+    from rfernet import DecryptionError as RFernetDecryptionError, Fernet as RFernet
+except ImportError:  # 未安装 rfernet 时使用 cryptography 实现
+    RFernet = None
+    RFernetDecryptionError = InvalidToken
+
+
+# AES-GCM 密文前缀（Fernet 令牌是 base64url，不含 ":"，据此区分两种格式）
+_AESGCM_PREFIX = "v2:"
+_AESGCM_NONCE_SIZE = 12
+# 二进制存储格式的版本字节（nonce | 密文 | tag 不做 base64）；文本格式的令牌都是 ASCII，不会以该字节开头
+_AESGCM_RAW_VERSION = b"\x02"
+
+# 文件分块加密：每块明文大小
+FILE_CHUNK_SIZE = 64 * 1024
+
+# 分块令牌格式与 Fernet 相同（version | timestamp | iv | ciphertext | hmac），但不做 base64 编码，
+# 每个令牌前写入 4 字节长度前缀；HMAC 额外覆盖分块序号与末块标记，防止分块被重排或截断
+_CHUNK_VERSION = b"\x80"
+_CHUNK_LENGTH = struct.Struct(">I")
+_CHUNK_POSITION = struct.Struct(">QB")
+_CHUNK_TIMESTAMP = struct.Struct(">Q")
+_CHUNK_OVERHEAD = 1 + 8 + 16 + 32  # version + timestamp + iv + hmac
+
+
+@lru_cache(maxsize=16)
+def _derive_fernet_key(key: str) -> bytes:
+    """
+    从配置的密钥派生 Fernet 密钥（同一密钥只计算一次）
+    
+    Args:
+        key: 原始密钥字符串
+        
+    Returns:
+        URL-safe base64 编码的 32 字节密钥
+    """
+    # 使用 SHA256 生成固定长度的密钥
+    key_hash = hashlib.sha256(key.encode('utf-8')).digest()
+    # Fernet 需要 URL-safe base64 编码的 32 字节密钥
+    return base64.urlsafe_b64encode(key_hash)
+
+
+@lru_cache(maxsize=16)
+def _derive_fernet(key: str) -> Fernet:
+    """获取指定密钥对应的 Fernet 对象（按密钥缓存）"""
+    return Fernet(_derive_fernet_key(key))
+
+
+@lru_cache(maxsize=16)
+def _derive_aesgcm(key: str) -> AESGCM:
+    """
+    获取指定密钥对应的 AESGCM 对象（按密钥缓存）
+    
+    通过 HKDF 从原始密钥派生独立的 256 位密钥，不与 Fernet 共用密钥材料
+    """
+    aes_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"prefab-gateway secret aes-gcm",
+    ).derive(key.encode('utf-8'))
+    return AESGCM(aes_key)
+
 
 class EncryptionService:
     """密钥加密服务"""
     
     def __init__(self):
         # 从配置的密钥派生 Fernet 密钥（32 字节 URL-safe base64 编码）
-        key_material = settings.ENCRYPTION_KEY.encode('utf-8')
-        # 使用 SHA256 生成固定长度的密钥
-        key_hash = hashlib.sha256(key_material).digest()
-        # Fernet 需要 URL-safe base64 编码的 32 字节密钥
-        self.fernet_key = base64.urlsafe_b64encode(key_hash)
-        self.fernet = Fernet(self.fernet_key)
+        self.fernet_key = _derive_fernet_key(settings.ENCRYPTION_KEY)
+        self.fernet = _derive_fernet(settings.ENCRYPTION_KEY)
+        # 与 Fernet 相同的密钥划分：前 16 字节用于 HMAC 签名，后 16 字节用于 AES 加密
+        raw_key = base64.urlsafe_b64decode(self.fernet_key)
+        self._signing_key = raw_key[:16]
+        self._encryption_key = raw_key[16:]
+        # rfernet 与 cryptography 的令牌格式相同，可以互相解密
+        self._rfernet = RFernet(self.fernet_key.decode('ascii')) if RFernet and settings.USE_RFERNET else None
+        self._aead = _derive_aesgcm(settings.ENCRYPTION_KEY)
+        self._use_aesgcm = settings.SECRET_CIPHER.lower() == "aesgcm"
     
     def encrypt(self, plaintext: str) -> str:
         """
         加密字符串
         
+        默认使用 AES-GCM（"v2:" + base64url(nonce | 密文 | tag)）；
+        SECRET_CIPHER=fernet 时生成 Fernet 令牌
+        
         Args:
             plaintext: 明文字符串
             
@@ -30,25 +112,201 @@ class EncryptionService:
         if not plaintext:
             return ""
         
+        if self._use_aesgcm:
+            nonce = os.urandom(_AESGCM_NONCE_SIZE)
+            sealed = self._aead.encrypt(nonce, plaintext.encode('utf-8'), None)
+            return _AESGCM_PREFIX + base64.urlsafe_b64encode(nonce + sealed).decode('ascii')
+        
+        if self._rfernet:
+            return self._rfernet.encrypt(plaintext.encode('utf-8'))
+        
         encrypted_bytes = self.fernet.encrypt(plaintext.encode('utf-8'))
         return encrypted_bytes.decode('utf-8')
     
     def decrypt(self, encrypted_text: str) -> str:
         """
-        解密字符串
+        解密字符串（自动识别 AES-GCM 与 Fernet 格式）
         
         Args:
             encrypted_text: 加密的字符串（base64 编码）
             
         Returns:
             解密后的明文字符串
+            
+        Raises:
+            InvalidToken: 密文被篡改或密钥不匹配
         """
         if not encrypted_text:
             return ""
         
+        if encrypted_text.startswith(_AESGCM_PREFIX):
+            try:
+                blob = base64.urlsafe_b64decode(encrypted_text[len(_AESGCM_PREFIX):])
+                nonce, sealed = blob[:_AESGCM_NONCE_SIZE], blob[_AESGCM_NONCE_SIZE:]
+                return self._aead.decrypt(nonce, sealed, None).decode('utf-8')
+            except (InvalidTag, ValueError):
+                raise InvalidToken
+        
+        if self._rfernet:
+            # rfernet 的 DecryptionError 统一转换为 InvalidToken，调用方不依赖安装了哪个实现
+            try:
+                return self._rfernet.decrypt(encrypted_text).decode('utf-8')
+            except RFernetDecryptionError:
+                raise InvalidToken
+        
         decrypted_bytes = self.fernet.decrypt(encrypted_text.encode('utf-8'))
         return decrypted_bytes.decode('utf-8')
     
+    def encrypt_bytes(self, plaintext: str) -> bytes:
+        """
+        加密字符串为二进制密文（用于 BLOB 列存储，省去 base64 编码）
+        
+        默认格式为 0x02 | nonce | 密文 | tag；SECRET_CIPHER=fernet 时为 Fernet 令牌的 ASCII 字节
+        
+        Args:
+            plaintext: 明文字符串
+            
+        Returns:
+            二进制密文
+        """
+        if not plaintext:
+            return b""
+        
+        if self._use_aesgcm:
+            nonce = os.urandom(_AESGCM_NONCE_SIZE)
+            sealed = self._aead.encrypt(nonce, plaintext.encode('utf-8'), None)
+            return _AESGCM_RAW_VERSION + nonce + sealed
+        
+        return self.encrypt(plaintext).encode('ascii')
+    
+    def decrypt_bytes(self, encrypted: bytes) -> str:
+        """
+        解密二进制密文（兼容迁移前以文本保存的 AES-GCM / Fernet 令牌）
+        
+        Args:
+            encrypted: 二进制密文
+            
+        Returns:
+            解密后的明文字符串
+            
+        Raises:
+            InvalidToken: 密文被篡改或密钥不匹配
+        """
+        if not encrypted:
+            return ""
+        
+        if encrypted[:1] == _AESGCM_RAW_VERSION:
+            nonce_end = 1 + _AESGCM_NONCE_SIZE
+            try:
+                return self._aead.decrypt(encrypted[1:nonce_end], encrypted[nonce_end:], None).decode('utf-8')
+            except (InvalidTag, ValueError):
+                raise InvalidToken
+        
+        try:
+            encrypted_text = encrypted.decode('ascii')
+        except UnicodeDecodeError:
+            # 既不是二进制格式也不是 ASCII 文本令牌：数据已损坏
+            raise InvalidToken
+        return self.decrypt(encrypted_text)
+    
+    def encrypt_file(
+        self,
+        src_path: Union[str, Path],
+        dst_path: Union[str, Path],
+        chunk_size: int = FILE_CHUNK_SIZE
+    ) -> None:
+        """
+        分块加密文件（内存占用只与块大小有关）
+        
+        Args:
+            src_path: 明文文件路径
+            dst_path: 密文输出路径
+            chunk_size: 每块明文字节数
+        """
+        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+            index = 0
+            chunk = src.read(chunk_size)
+            while True:
+                next_chunk = src.read(chunk_size)
+                is_last = not next_chunk
+                token = self._encrypt_chunk(chunk, index, is_last)
+                dst.write(_CHUNK_LENGTH.pack(len(token)))
+                dst.write(token)
+                if is_last:
+                    break
+                chunk = next_chunk
+                index += 1
+    
+    def decrypt_file(self, src_path: Union[str, Path], dst_path: Union[str, Path]) -> None:
+        """
+        解密由 encrypt_file 生成的文件
+        
+        Args:
+            src_path: 密文文件路径
+            dst_path: 明文输出路径（解密失败时会被删除）
+            
+        Raises:
+            InvalidToken: 密文被篡改、截断或密钥不匹配
+        """
+        try:
+            with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+                index = 0
+                header = src.read(_CHUNK_LENGTH.size)
+                while True:
+                    if len(header) != _CHUNK_LENGTH.size:
+                        raise InvalidToken
+                    (length,) = _CHUNK_LENGTH.unpack(header)
+                    token = src.read(length)
+                    if len(token) != length:
+                        raise InvalidToken
+                    header = src.read(_CHUNK_LENGTH.size)
+                    is_last = not header
+                    dst.write(self._decrypt_chunk(token, index, is_last))
+                    if is_last:
+                        break
+                    index += 1
+        except Exception:
+            Path(dst_path).unlink(missing_ok=True)
+            raise
+    
+    def _chunk_mac(self, index: int, is_last: bool, body: bytes) -> HMAC:
+        """构建覆盖分块位置与令牌内容的 HMAC"""
+        mac = HMAC(self._signing_key, hashes.SHA256())
+        mac.update(_CHUNK_POSITION.pack(index, is_last))
+        mac.update(body)
+        return mac
+    
+    def _encrypt_chunk(self, data: bytes, index: int, is_last: bool) -> bytes:
+        """加密单个分块，返回原始字节令牌"""
+        iv = os.urandom(16)
+        padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        padded = padder.update(data) + padder.finalize()
+        encryptor = Cipher(algorithms.AES(self._encryption_key), modes.CBC(iv)).encryptor()
+        ciphertext = encryptor.update(padded) + encryptor.finalize()
+        
+        body = _CHUNK_VERSION + _CHUNK_TIMESTAMP.pack(int(time.time())) + iv + ciphertext
+        return body + self._chunk_mac(index, is_last, body).finalize()
+    
+    def _decrypt_chunk(self, token: bytes, index: int, is_last: bool) -> bytes:
+        """校验并解密单个分块"""
+        if len(token) < _CHUNK_OVERHEAD or token[:1] != _CHUNK_VERSION:
+            raise InvalidToken
+        
+        body, signature = token[:-32], token[-32:]
+        try:
+            self._chunk_mac(index, is_last, body).verify(signature)
+        except InvalidSignature:
+            raise InvalidToken
+        
+        iv, ciphertext = body[9:25], body[25:]
+        try:
+            decryptor = Cipher(algorithms.AES(self._encryption_key), modes.CBC(iv)).decryptor()
+            padded = decryptor.update(ciphertext) + decryptor.finalize()
+            unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+            return unpadder.update(padded) + unpadder.finalize()
+        except ValueError:
+            raise InvalidToken
+    
     def rotate_key(self, old_key: str, new_key: str) -> tuple[Fernet, Fernet]:
         """
         生成密钥轮转所需的 Fernet 对象
@@ -60,13 +318,7 @@ class EncryptionService:
         Returns:
             (old_fernet, new_fernet) 元组
         """
-        old_key_hash = hashlib.sha256(old_key.encode('utf-8')).digest()
-        new_key_hash = hashlib.sha256(new_key.encode('utf-8')).digest()
-        
-        old_fernet = Fernet(base64.urlsafe_b64encode(old_key_hash))
-        new_fernet = Fernet(base64.urlsafe_b64encode(new_key_hash))
-        
-        return old_fernet, new_fernet
+        return _derive_fernet(old_key), _derive_fernet(new_key)
 
 
 # 全局加密服务实例
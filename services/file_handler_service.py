@@ -8,20 +8,70 @@
 """
 import asyncio
 import logging
+import os
 import shutil
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import Dict, Any, Optional
 
 import aioboto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from config.settings import settings
+from services.spec_cache_service import SpecCacheService
 
 logger = logging.getLogger(__name__)
 
+# S3 传输配置：超过 8 MB 的对象拆分为 16 MB 分片并发传输（分段上传 / Range GET）
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=16
+)
+
+# 待删除工作目录的回收目录名（位于 workspace_root 下）
+_TRASH_DIR_NAME = ".trash"
+
+
+def _drop_page_cache(path: Path) -> None:
+    """
+    通知内核丢弃文件的页缓存（仅 Linux 等支持 posix_fadvise 的平台）
+    
+    上传完成后工作区文件只等待清理，继续占用页缓存只会挤掉其他进程的热数据
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _dir_size(path) -> int:
+    """
+    递归统计目录中文件的总大小
+    
+    使用 os.scandir，DirEntry 缓存了类型信息，每个文件只需一次 stat
+    """
+    total = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                total += _dir_size(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
 
 class FileHandlerService:
     """文件处理服务"""
@@ -32,7 +82,8 @@ class FileHandlerService:
         s3_bucket: Optional[str] = None,
         s3_prefix: str = "",
         s3_endpoint_url: Optional[str] = None,
-        s3_region: Optional[str] = None
+        s3_region: Optional[str] = None,
+        s3_max_concurrency: int = 16
     ):
         """
         初始化文件处理服务
@@ -43,6 +94,7 @@ class FileHandlerService:
             s3_prefix: S3 路径前缀（用于共享存储桶时区分项目）
             s3_endpoint_url: S3 自定义 endpoint（用于阿里云 OSS 等 S3 兼容存储）
             s3_region: S3 区域名称
+            s3_max_concurrency: 同时进行的 S3 传输数上限
         """
         self.workspace_root = Path(workspace_root)
         self._cleanup_task = None
@@ -59,18 +111,65 @@ class FileHandlerService:
         # 初始化 aioboto3 session
         self.s3_session = aioboto3.Session()
         
+        # S3 客户端参数（构造一次，客户端关闭后重建时复用）
+        self._client_kwargs: Dict[str, Any] = {
+            'config': Config(
+                max_pool_connections=64,
+                retries={'max_attempts': 10, 'mode': 'adaptive'}
+            )
+        }
+        if s3_endpoint_url:
+            self._client_kwargs['endpoint_url'] = s3_endpoint_url
+        if s3_region:
+            self._client_kwargs['region_name'] = s3_region
+        
+        # 长期复用的 S3 客户端（首次使用时创建，复用连接池与凭证）
+        self._s3_client = None
+        self._s3_cm = None
+        self._s3_lock = asyncio.Lock()
+        self._s3_semaphore = asyncio.Semaphore(s3_max_concurrency)
+        
+        # 删除工作目录的专用线程池（rmtree 可能耗时数百毫秒，不能阻塞事件循环）
+        self._cleanup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fh-cleanup")
+        
         # 确保根目录存在
         if not self.workspace_root.exists():
-            logger.warning(f"Workspace root does not exist: {self.workspace_root}")
+            logger.warning("Workspace root does not exist: %s", self.workspace_root)
             logger.warning("File handling will be disabled (PVC not mounted)")
             self.workspace_root = None
         else:
-            logger.info(f"File handler initialized with workspace: {self.workspace_root}")
-            logger.info(f"S3 output bucket: {self.s3_bucket}")
+            logger.info("File handler initialized with workspace: %s", self.workspace_root)
+            logger.info("S3 output bucket: %s", self.s3_bucket)
             if self.s3_prefix:
-                logger.info(f"S3 path prefix: {self.s3_prefix}")
+                logger.info("S3 path prefix: %s", self.s3_prefix)
             if self.s3_endpoint_url:
-                logger.info(f"S3 custom endpoint: {self.s3_endpoint_url}")
+                logger.info("S3 custom endpoint: %s", self.s3_endpoint_url)
+    
+    async def _get_s3(self):
+        """
+        获取共享的 S3 客户端（首次调用时创建）
+        
+        Returns:
+            aiobotocore S3 客户端
+        """
+        if self._s3_client is not None:
+            return self._s3_client
+        
+        async with self._s3_lock:
+            if self._s3_client is None:
+                self._s3_cm = self.s3_session.client('s3', **self._client_kwargs)
+                self._s3_client = await self._s3_cm.__aenter__()
+                logger.info("S3 client created")
+        
+        return self._s3_client
+    
+    async def close(self) -> None:
+        """关闭共享的 S3 客户端"""
+        if self._s3_cm is not None:
+            await self._s3_cm.__aexit__(None, None, None)
+            self._s3_cm = None
+            self._s3_client = None
+            logger.info("S3 client closed")
     
     def create_workspace(self, job_id: Optional[str] = None) -> Path:
         """
@@ -86,12 +185,12 @@ class FileHandlerService:
             raise RuntimeError("PVC not mounted, cannot create workspace")
         
         if not job_id:
-            job_id = str(uuid.uuid4())
+            job_id = uuid.uuid4().hex
         
         workspace = self.workspace_root / job_id
         workspace.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"Created workspace: {workspace}")
+        logger.info("Created workspace: %s", workspace)
         return workspace
     
     async def download_input_files(
@@ -114,23 +213,27 @@ class FileHandlerService:
             处理后的输入参数（S3 URL 替换为本地路径）
         """
         if not self.workspace_root:
-            logger.warning(f"[{request_id}] PVC not mounted, skipping file download")
+            logger.warning("[%s] PVC not mounted, skipping file download", request_id)
             return inputs
         
-        processed_inputs = inputs.copy()
-        parameters = function_def.get("parameters", [])
-        
-        for param in parameters:
-            param_name = param.get("name")
-            param_type = param.get("type")
-            
-            if param_type == "InputFile" and param_name in inputs:
+        names = []
+        downloads = []
+        for param_name in SpecCacheService.input_file_params(function_def):
+            if param_name in inputs:
                 s3_url = inputs[param_name]
-                logger.info(f"[{request_id}] Processing InputFile: {param_name} = {s3_url}")
-                
-                # 从 S3 下载到 workspace
-                local_path = await self._download_from_s3(s3_url, workspace, param_name, request_id)
-                processed_inputs[param_name] = str(local_path)
+                logger.info("[%s] Processing InputFile: %s = %s", request_id, param_name, s3_url)
+                names.append(param_name)
+                downloads.append(self._download_from_s3(s3_url, workspace, param_name, request_id))
+        
+        # 没有文件参数时原样返回，避免复制输入
+        if not downloads:
+            return inputs
+        
+        # 并发从 S3 下载到 workspace
+        local_paths = await asyncio.gather(*downloads)
+        processed_inputs = inputs.copy()
+        for param_name, local_path in zip(names, local_paths):
+            processed_inputs[param_name] = str(local_path)
         
         return processed_inputs
     
@@ -154,26 +257,33 @@ class FileHandlerService:
             处理后的输出（本地路径替换为 S3 URL）
         """
         if not self.workspace_root:
-            logger.warning(f"[{request_id}] PVC not mounted, skipping file upload")
+            logger.warning("[%s] PVC not mounted, skipping file upload", request_id)
             return output
         
-        processed_output = output.copy()
-        returns = function_def.get("returns", {})
-        properties = returns.get("properties", {})
-        
-        for field_name, field_def in properties.items():
-            if field_def.get("type") == "OutputFile" and field_name in output:
+        names = []
+        uploads = []
+        for field_name in SpecCacheService.output_file_fields(function_def):
+            if field_name in output:
                 local_path = Path(output[field_name])
-                logger.info(f"[{request_id}] Processing OutputFile: {field_name} = {local_path}")
+                logger.info("[%s] Processing OutputFile: %s = %s", request_id, field_name, local_path)
                 
                 # 验证文件存在
                 if not local_path.exists():
-                    logger.error(f"[{request_id}] Output file not found: {local_path}")
+                    logger.error("[%s] Output file not found: %s", request_id, local_path)
                     raise FileNotFoundError(f"Output file not found: {local_path}")
                 
-                # 上传到 S3
-                s3_url = await self._upload_to_s3(local_path, request_id)
-                processed_output[field_name] = s3_url
+                names.append(field_name)
+                uploads.append(self._upload_to_s3(local_path, request_id))
+        
+        # 没有文件输出时原样返回，避免复制输出
+        if not uploads:
+            return output
+        
+        # 并发上传到 S3
+        s3_urls = await asyncio.gather(*uploads)
+        processed_output = output.copy()
+        for field_name, s3_url in zip(names, s3_urls):
+            processed_output[field_name] = s3_url
         
         return processed_output
     
@@ -181,18 +291,40 @@ class FileHandlerService:
         """
         清理工作目录
         
+        先把目录重命名到回收目录（O(1)），再提交到后台线程池删除，本方法立即返回；
+        进程退出前未删完的目录由清理守护进程兜底
+        
         Args:
             workspace: 要清理的工作目录
             request_id: 请求 ID
         """
-        if not workspace or not workspace.exists():
+        if not workspace:
+            return
+        
+        target = workspace
+        if self.workspace_root:
+            trash = self.workspace_root / _TRASH_DIR_NAME / uuid.uuid4().hex
+            try:
+                trash.parent.mkdir(exist_ok=True)
+                os.rename(workspace, trash)
+                target = trash
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                logger.warning("[%s] Failed to move workspace %s to trash: %s", request_id, workspace, e)
+        
+        self._cleanup_pool.submit(self._remove_workspace, target, workspace, request_id)
+    
+    def _remove_workspace(self, path: Path, workspace: Path, request_id: str) -> None:
+        """删除工作目录（在清理线程池中执行；path 为实际路径，workspace 为原路径，用于日志）"""
+        if not path.exists():
             return
         
         try:
-            shutil.rmtree(workspace)
-            logger.info(f"[{request_id}] Cleaned up workspace: {workspace}")
+            shutil.rmtree(path)
+            logger.info("[%s] Cleaned up workspace: %s", request_id, workspace)
         except Exception as e:
-            logger.error(f"[{request_id}] Failed to cleanup workspace {workspace}: {e}")
+            logger.error("[%s] Failed to cleanup workspace %s: %s", request_id, workspace, e)
     
     async def _download_from_s3(
         self,
@@ -229,29 +361,23 @@ class FileHandlerService:
         local_filename = f"input_{param_name}{file_ext}"
         local_path = workspace / local_filename
         
-        logger.info(f"[{request_id}] Downloading from S3: {bucket}/{key} -> {local_path}")
+        logger.info("[%s] Downloading from S3: %s/%s -> %s", request_id, bucket, key, local_path)
         
         try:
-            # 构建 client 参数
-            client_kwargs = {}
-            if self.s3_endpoint_url:
-                client_kwargs['endpoint_url'] = self.s3_endpoint_url
-            if self.s3_region:
-                client_kwargs['region_name'] = self.s3_region
-            
-            async with self.s3_session.client('s3', **client_kwargs) as s3:
-                await s3.download_file(bucket, key, str(local_path))
+            s3 = await self._get_s3()
+            async with self._s3_semaphore:
+                await s3.download_file(bucket, key, str(local_path), Config=_TRANSFER_CONFIG)
             
             file_size = local_path.stat().st_size
-            logger.info(f"[{request_id}] Downloaded successfully: {file_size} bytes")
+            logger.info("[%s] Downloaded successfully: %s bytes", request_id, file_size)
             return local_path
         
         except ClientError as e:
             error_code = e.response['Error']['Code']
-            logger.error(f"[{request_id}] S3 download failed: {error_code} - {e}")
+            logger.error("[%s] S3 download failed: %s - %s", request_id, error_code, e)
             raise RuntimeError(f"Failed to download file from S3: {error_code}") from e
         except Exception as e:
-            logger.error(f"[{request_id}] Unexpected error during S3 download: {e}")
+            logger.error("[%s] Unexpected error during S3 download: %s", request_id, e)
             raise
     
     async def _upload_to_s3(
@@ -275,40 +401,41 @@ class FileHandlerService:
         date_path = f"{now.year}/{now.month:02d}/{now.day:02d}"
         
         file_ext = local_path.suffix
-        unique_id = str(uuid.uuid4())
+        unique_id = uuid.uuid4().hex
         s3_key = f"{self.s3_prefix}prefab-outputs/{date_path}/{request_id}/{unique_id}{file_ext}"
         
-        logger.info(f"[{request_id}] Uploading to S3: {local_path} -> {self.s3_bucket}/{s3_key}")
+        logger.info("[%s] Uploading to S3: %s -> %s/%s", request_id, local_path, self.s3_bucket, s3_key)
         
         try:
             file_size = local_path.stat().st_size
             
-            # 构建 client 参数
-            client_kwargs = {}
-            if self.s3_endpoint_url:
-                client_kwargs['endpoint_url'] = self.s3_endpoint_url
-            if self.s3_region:
-                client_kwargs['region_name'] = self.s3_region
-            
-            async with self.s3_session.client('s3', **client_kwargs) as s3:
-                await s3.upload_file(str(local_path), self.s3_bucket, s3_key)
+            s3 = await self._get_s3()
+            async with self._s3_semaphore:
+                if file_size < _TRANSFER_CONFIG.multipart_threshold:
+                    # 小文件直接一次 PutObject，省去 TransferManager 的调度开销
+                    body = await asyncio.to_thread(local_path.read_bytes)
+                    await s3.put_object(Bucket=self.s3_bucket, Key=s3_key, Body=body)
+                else:
+                    await s3.upload_file(str(local_path), self.s3_bucket, s3_key, Config=_TRANSFER_CONFIG)
+            _drop_page_cache(local_path)
             
             s3_url = f"s3://{self.s3_bucket}/{s3_key}"
-            logger.info(f"[{request_id}] Uploaded successfully: {file_size} bytes -> {s3_url}")
+            logger.info("[%s] Uploaded successfully: %s bytes -> %s", request_id, file_size, s3_url)
             return s3_url
         
         except ClientError as e:
             error_code = e.response['Error']['Code']
-            logger.error(f"[{request_id}] S3 upload failed: {error_code} - {e}")
+            logger.error("[%s] S3 upload failed: %s - %s", request_id, error_code, e)
             raise RuntimeError(f"Failed to upload file to S3: {error_code}") from e
         except Exception as e:
-            logger.error(f"[{request_id}] Unexpected error during S3 upload: {e}")
+            logger.error("[%s] Unexpected error during S3 upload: %s", request_id, e)
             raise
     
     async def start_cleanup_daemon(
         self,
         interval_seconds: int = 300,
-        max_age_seconds: int = 3600
+        max_age_seconds: int = 3600,
+        measure_size: bool = True
     ) -> None:
         """
         启动清理守护进程
@@ -316,66 +443,103 @@ class FileHandlerService:
         Args:
             interval_seconds: 清理间隔（默认 5 分钟）
             max_age_seconds: 工作目录最大保留时间（默认 1 小时）
+            measure_size: 是否统计释放的空间（仅用于日志）
         """
         if not self.workspace_root:
             logger.info("Workspace not available, cleanup daemon disabled")
             return
         
-        logger.info(f"Starting cleanup daemon (interval={interval_seconds}s, max_age={max_age_seconds}s)")
+        logger.info("Starting cleanup daemon (interval=%ss, max_age=%ss)", interval_seconds, max_age_seconds)
         
         while True:
             try:
                 await asyncio.sleep(interval_seconds)
-                await self._run_cleanup(max_age_seconds)
+                await self._run_cleanup(max_age_seconds, measure_size)
             except Exception as e:
-                logger.error(f"Cleanup daemon error: {e}", exc_info=True)
+                logger.error("Cleanup daemon error: %s", e, exc_info=True)
     
-    async def _run_cleanup(self, max_age_seconds: int) -> None:
-        """执行一次清理"""
+    async def _run_cleanup(self, max_age_seconds: int, measure_size: bool = True) -> None:
+        """执行一次清理（阻塞的文件系统操作都在线程池中执行，不阻塞事件循环）"""
         if not self.workspace_root or not self.workspace_root.exists():
             return
         
         now = time.time()
         cutoff_time = now - max_age_seconds
         
-        cleaned_count = 0
-        total_size = 0
-        
         try:
-            for job_dir in self.workspace_root.iterdir():
-                if not job_dir.is_dir():
-                    continue
-                
-                # 检查修改时间
-                mtime = job_dir.stat().st_mtime
-                if mtime < cutoff_time:
-                    # 计算目录大小（用于日志）
-                    try:
-                        dir_size = sum(f.stat().st_size for f in job_dir.rglob('*') if f.is_file())
-                        total_size += dir_size
-                    except:
-                        pass
-                    
-                    # 删除目录
-                    shutil.rmtree(job_dir)
-                    cleaned_count += 1
-                    logger.info(f"Cleaned expired workspace: {job_dir.name}")
+            job_dirs = await asyncio.to_thread(
+                lambda: [d for d in self.workspace_root.iterdir() if d.name != _TRASH_DIR_NAME]
+            )
+            
+            # 所有目录一次性提交到清理线程池（池大小即并发上限）
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(
+                loop.run_in_executor(self._cleanup_pool, self._cleanup_one, job_dir, cutoff_time, measure_size)
+                for job_dir in job_dirs
+            ))
+            freed = [size for size in results if size is not None]
+            cleaned_count = len(freed)
+            
+            # 清空回收目录中的残留（例如进程重启前未删完的目录）
+            trash_dir = self.workspace_root / _TRASH_DIR_NAME
+            trash_entries = await asyncio.to_thread(
+                lambda: list(trash_dir.iterdir()) if trash_dir.is_dir() else []
+            )
+            await asyncio.gather(*(
+                loop.run_in_executor(self._cleanup_pool, partial(shutil.rmtree, entry, ignore_errors=True))
+                for entry in trash_entries
+            ))
             
             if cleaned_count > 0:
-                size_mb = total_size / (1024 * 1024)
-                logger.info(f"Cleanup summary: removed {cleaned_count} workspaces, freed {size_mb:.2f} MB")
+                if measure_size:
+                    size_mb = sum(freed) / (1024 * 1024)
+                    logger.info("Cleanup summary: removed %s workspaces, freed %.2f MB", cleaned_count, size_mb)
+                else:
+                    logger.info("Cleanup summary: removed %s workspaces", cleaned_count)
             
             # 检查磁盘使用率
-            usage = shutil.disk_usage(self.workspace_root)
+            usage = await asyncio.to_thread(shutil.disk_usage, self.workspace_root)
             usage_percent = (usage.used / usage.total) * 100
             
             if usage_percent > 80:
-                logger.warning(f"Workspace disk usage high: {usage_percent:.1f}%")
+                logger.warning("Workspace disk usage high: %.1f%%", usage_percent)
                 if usage_percent > 90:
-                    logger.error(f"Workspace disk usage critical: {usage_percent:.1f}%, emergency cleanup recommended")
+                    logger.error("Workspace disk usage critical: %.1f%%, emergency cleanup recommended", usage_percent)
         
         except Exception as e:
-            logger.error(f"Cleanup failed: {e}", exc_info=True)
+            logger.error("Cleanup failed: %s", e, exc_info=True)
+    
+    def _cleanup_one(self, job_dir: Path, cutoff_time: float, measure_size: bool) -> Optional[int]:
+        """
+        检查并删除单个过期工作目录（在线程池中执行）
+        
+        Args:
+            job_dir: 工作目录
+            cutoff_time: 修改时间早于该时间戳的目录视为过期
+            measure_size: 是否统计目录大小
+        
+        Returns:
+            释放的字节数（未统计时为 0）；目录未过期或不是目录时返回 None
+        """
+        if not job_dir.is_dir():
+            return None
+        
+        # 检查修改时间
+        if job_dir.stat().st_mtime >= cutoff_time:
+            return None
+        
+        # 计算目录大小（用于日志）
+        dir_size = 0
+        if measure_size:
+            try:
+                dir_size = _dir_size(job_dir)
+            except OSError:
+                pass
+        
+        # 删除目录
+        shutil.rmtree(job_dir)
+        logger.info("Cleaned expired workspace: %s", job_dir.name)
+        return dir_size
 
 
 # 创建全局单例（从配置文件读取设置）
@@ -384,6 +548,7 @@ file_handler_service = FileHandlerService(
     s3_bucket=settings.s3_bucket,
     s3_prefix=settings.s3_prefix,
     s3_endpoint_url=settings.s3_endpoint_url,
-    s3_region=settings.s3_region
+    s3_region=settings.s3_region,
+    s3_max_concurrency=settings.s3_max_concurrency
 )
 
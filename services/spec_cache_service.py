@@ -2,48 +2,86 @@
 预制件规格缓存服务 (SpecCache Service)
 
 负责缓存和检索预制件的接口规格（manifest）
-双层缓存架构：L1=Redis, L2=MySQL
+多层缓存架构：L0=进程内 LRU, L1=Redis, L2=MySQL
 """
-import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
+import orjson
 import redis.asyncio as redis
-from sqlalchemy import select, and_
+from cachetools import TTLCache
+from sqlalchemy import Text, select, bindparam, type_coerce, update, delete, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.settings import settings
 from db.models import PrefabSpec, DeploymentStatus
+from db.session import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
+# 进程内缓存（L0 / 内存回退）中附加的函数索引字段：{函数名: 在 functions 列表中的位置}
+FUNCTION_INDEX_FIELD = "_function_index"
+# 进程内缓存中附加在每个函数定义上的字段：InputFile 参数名列表 / OutputFile 返回字段名列表
+INPUT_FILES_FIELD = "_input_files"
+OUTPUT_FILES_FIELD = "_output_files"
+# 删除规格时先写入 Redis 的墓碑值及其存活秒数：读路径视为未命中，且不会覆盖回写
+_TOMBSTONE = b"__tombstone__"
+_TOMBSTONE_TTL = 5
+
+# 按 (prefab_id, version) 读取规格原始 JSON 文本（绕过 JSON 类型的反序列化），原样写入 Redis，无需再序列化一次
+# 模块加载时构建一次，执行时只绑定参数
+_SPEC_RAW_BY_KEY = select(
+    PrefabSpec.id,
+    type_coerce(PrefabSpec.spec_json, Text).label("spec_raw")
+).where(
+    PrefabSpec.prefab_id == bindparam("prefab_id"),
+    PrefabSpec.version == bindparam("version")
+)
+
 
 class SpecCacheService:
     """
     预制件规格缓存服务
     
-    双层缓存架构：
+    多层缓存架构：
+    - L0 (进程内): 有界 LRU + 短 TTL，热点规格无需访问 Redis
     - L1 (Redis): 快速访问，TTL 管理
     - L2 (MySQL): 持久化存储，包含部署状态
     """
     
     def __init__(self) -> None:
         self._redis: Optional[redis.Redis] = None
+        self._redis_pool: Optional[redis.ConnectionPool] = None
         # 内存回退存储（Redis 不可用时使用）
         self._memory_cache: Dict[str, Dict[str, Any]] = {}
         self._use_memory = False
         self._redis_ttl = 3600  # Redis 缓存 1 小时
+        # L0 进程内缓存：本进程的写入会主动失效，短 TTL 兜住其他 worker 的更新
+        self._l0: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize=1024, ttl=60)
+        # 负缓存：短时间内记住不存在的规格，避免无效请求反复穿透 Redis/MySQL
+        self._negative_cache: TTLCache[str, bool] = TTLCache(maxsize=2048, ttl=10)
+        # 待落库的调用统计：{PrefabSpec.id: (新增调用次数, 最后调用时间)}，由后台任务定期批量写入
+        self._pending_stats: Dict[int, Tuple[int, datetime]] = {}
     
     async def connect(self) -> None:
         """连接到 Redis"""
         try:
-            self._redis = redis.Redis(
+            # 显式连接池：限制连接数，所有调用复用同一组 TCP 连接
+            self._redis_pool = redis.ConnectionPool(
                 host=settings.redis_host,
                 port=settings.redis_port,
                 db=settings.redis_db,
                 password=settings.redis_password,
-                decode_responses=True,
+                # 不在客户端解码：读到的 bytes 直接交给 orjson 解析，省去一次 UTF-8 解码
+                decode_responses=False,
+                max_connections=settings.redis_max_connections,
+                health_check_interval=30,
+                socket_keepalive=True,
+                retry_on_timeout=True,
             )
+            self._redis = redis.Redis(connection_pool=self._redis_pool)
             # 测试连接
             await self._redis.ping()
             logger.info(f"SpecCacheService connected to Redis at {settings.redis_host}:{settings.redis_port}")
@@ -54,13 +92,81 @@ class SpecCacheService:
     async def close(self) -> None:
         """关闭 Redis 连接"""
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose()
+            if self._redis_pool:
+                await self._redis_pool.disconnect()
             logger.info("SpecCacheService disconnected from Redis")
     
     def _make_key(self, prefab_id: str, version: str) -> str:
         """生成缓存键"""
         return f"spec:{prefab_id}:{version}"
     
+    @staticmethod
+    def find_function(spec: Dict[str, Any], function_name: str) -> Optional[Dict[str, Any]]:
+        """
+        在规格中查找函数定义
+        
+        优先使用进程内缓存中预建的函数索引，索引缺失时回退为线性查找
+        
+        Args:
+            spec: 预制件规格
+            function_name: 函数名
+        
+        Returns:
+            函数定义，如果不存在返回 None
+        """
+        functions = spec.get("functions", [])
+        function_index = spec.get(FUNCTION_INDEX_FIELD)
+        if function_index is not None:
+            position = function_index.get(function_name)
+            return functions[position] if position is not None else None
+        
+        for func in functions:
+            if func.get("name") == function_name:
+                return func
+        return None
+    
+    @staticmethod
+    def input_file_params(function_def: Dict[str, Any]) -> List[str]:
+        """
+        获取函数中 InputFile 类型的参数名
+        
+        优先使用进程内缓存中预计算的列表，缺失时从 parameters 计算
+        """
+        names = function_def.get(INPUT_FILES_FIELD)
+        if names is None:
+            names = [
+                param.get("name")
+                for param in function_def.get("parameters", [])
+                if param.get("type") == "InputFile"
+            ]
+        return names
+    
+    @staticmethod
+    def output_file_fields(function_def: Dict[str, Any]) -> List[str]:
+        """
+        获取函数返回值中 OutputFile 类型的字段名
+        
+        优先使用进程内缓存中预计算的列表，缺失时从 returns.properties 计算
+        """
+        names = function_def.get(OUTPUT_FILES_FIELD)
+        if names is None:
+            properties = function_def.get("returns", {}).get("properties", {})
+            names = [
+                field_name
+                for field_name, field_def in properties.items()
+                if field_def.get("type") == "OutputFile"
+            ]
+        return names
+    
+    @staticmethod
+    def public_functions(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """返回去掉进程内预计算字段后的函数定义列表（用于对外输出）"""
+        return [
+            {k: v for k, v in func.items() if k not in (INPUT_FILES_FIELD, OUTPUT_FILES_FIELD)}
+            for func in spec.get("functions", [])
+        ]
+    
     async def get_spec(
         self,
         prefab_id: str,
@@ -70,7 +176,7 @@ class SpecCacheService:
         """
         获取预制件规格（双层缓存）
         
-        查询顺序：Redis → MySQL → None
+        查询顺序：进程内 → Redis → MySQL → None
         
         Args:
             prefab_id: 预制件 ID
@@ -82,6 +188,14 @@ class SpecCacheService:
         """
         key = self._make_key(prefab_id, version)
         
+        spec = self._l0.get(key)
+        if spec is not None:
+            return spec
+        
+        if key in self._negative_cache:
+            logger.debug(f"Spec cache HIT (negative): {key}")
+            return None
+        
         # L1: 尝试从 Redis/内存获取
         try:
             if self._use_memory:
@@ -91,45 +205,216 @@ class SpecCacheService:
                     return spec_json
             else:
                 if self._redis:
-                    spec_json_str = await self._redis.get(key)
-                    if spec_json_str:
+                    spec_blob = await self._redis.get(key)
+                    if spec_blob == _TOMBSTONE:
+                        # 规格正在删除：直接回源数据库，且不回写 L1
+                        logger.debug(f"Spec cache tombstone (L1-redis): {key}")
+                        loaded = await self._load_from_db(prefab_id, version, db)
+                        return loaded[0] if loaded else None
+                    if spec_blob:
                         logger.debug(f"Spec cache HIT (L1-redis): {key}")
-                        return json.loads(spec_json_str)
+                        spec = self._build_cached_spec(orjson.loads(spec_blob))
+                        self._l0[key] = spec
+                        return spec
         except Exception as e:
             logger.warning(f"L1 cache read error: {e}, falling back to L2")
         
-        # L2: 从数据库获取
+        # L2: 从数据库获取，并把原始 JSON 文本写回 L1
+        loaded = await self._load_from_db(prefab_id, version, db)
+        if loaded is None:
+            return None
+        spec, spec_raw = loaded
+        await self._set_redis_cache(key, spec, spec_raw, only_if_absent=True)
+        return spec
+    
+    async def mget_specs(
+        self,
+        pairs: List[Tuple[str, str]],
+        db: AsyncSession
+    ) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """
+        批量获取预制件规格（双层缓存）
+        
+        L1 通过一次 Redis MGET 获取，未命中的通过一次 (prefab_id, version) IN 查询回源 MySQL
+        
+        Args:
+            pairs: (prefab_id, version) 列表，重复项只查询一次
+            db: 数据库会话
+        
+        Returns:
+            以 (prefab_id, version) 为键的规格字典，不存在的值为 None
+        """
+        unique_pairs = list(dict.fromkeys(pairs))
+        specs: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        if not unique_pairs:
+            return specs
+        
+        keys = [self._make_key(prefab_id, version) for prefab_id, version in unique_pairs]
+        
+        # L0 命中的直接返回，负缓存命中的直接视为不存在
+        for pair, key in zip(unique_pairs, keys):
+            spec = self._l0.get(key)
+            if spec is not None:
+                specs[pair] = spec
+            elif key in self._negative_cache:
+                specs[pair] = None
+        
+        # L1: 一次性从 Redis/内存获取；命中墓碑的键回源后不回写
+        tombstoned: set = set()
         try:
-            stmt = select(PrefabSpec).where(
-                and_(
-                    PrefabSpec.prefab_id == prefab_id,
-                    PrefabSpec.version == version
-                )
-            )
-            result = await db.execute(stmt)
-            record = result.scalar_one_or_none()
+            if self._use_memory:
+                for pair, key in zip(unique_pairs, keys):
+                    if pair in specs:
+                        continue
+                    spec_json = self._memory_cache.get(key)
+                    if spec_json:
+                        specs[pair] = spec_json
+            elif self._redis:
+                pending = [(pair, key) for pair, key in zip(unique_pairs, keys) if pair not in specs]
+                values = await self._redis.mget([key for _, key in pending]) if pending else []
+                for (pair, key), spec_blob in zip(pending, values):
+                    if spec_blob == _TOMBSTONE:
+                        tombstoned.add(key)
+                    elif spec_blob:
+                        specs[pair] = self._l0[key] = self._build_cached_spec(orjson.loads(spec_blob))
+            logger.debug(f"Spec cache batch HIT (L1/negative): {len(specs)}/{len(unique_pairs)}")
+        except Exception as e:
+            logger.warning(f"L1 cache batch read error: {e}, falling back to L2")
+        
+        # L2: 未命中的一次性从数据库获取，回源结果一次性批量写回 L1
+        missing = [(pair, key) for pair, key in zip(unique_pairs, keys) if pair not in specs]
+        loaded_many = await self._load_many_from_db([pair for pair, _ in missing], db) if missing else {}
+        warmed: List[Tuple[str, Dict[str, Any], str]] = []
+        for pair, key in missing:
+            loaded = loaded_many.get(pair)
+            specs[pair] = loaded[0] if loaded else None
+            if loaded is not None and key not in tombstoned:
+                warmed.append((key, *loaded))
+        
+        if warmed:
+            await self._set_redis_cache_many(warmed, only_if_absent=True)
+        
+        return specs
+    
+    async def _load_from_db(
+        self,
+        prefab_id: str,
+        version: str,
+        db: AsyncSession
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        从数据库读取规格（内部方法，由调用方负责回写 L1）
+        
+        调用统计先在内存中累计，由后台任务批量落库
+        
+        Returns:
+            (规格字典, 原始 JSON 文本)，不存在时返回 None
+        """
+        key = self._make_key(prefab_id, version)
+        
+        try:
+            result = await db.execute(_SPEC_RAW_BY_KEY, {"prefab_id": prefab_id, "version": version})
+            row = result.one_or_none()
             
-            if record:
+            if row:
                 logger.debug(f"Spec cache HIT (L2-db): {key}")
-                spec = record.spec_json
-                
-                # 更新统计
-                record.last_called_at = datetime.utcnow()
-                record.call_count += 1
-                await db.commit()
+                spec_id, spec_raw = row
                 
-                # 写回 L1 缓存
-                await self._set_redis_cache(key, spec)
+                # 记录调用统计（由后台任务批量落库）
+                count, _ = self._pending_stats.get(spec_id, (0, None))
+                self._pending_stats[spec_id] = (count + 1, datetime.utcnow())
                 
-                return spec
+                return orjson.loads(spec_raw), spec_raw
             else:
                 logger.debug(f"Spec cache MISS (all layers): {key}")
+                self._negative_cache[key] = True
                 return None
                 
         except Exception as e:
             logger.error(f"Error getting spec from database: {e}")
             return None
     
+    async def _load_many_from_db(
+        self,
+        pairs: List[Tuple[str, str]],
+        db: AsyncSession
+    ) -> Dict[Tuple[str, str], Tuple[Dict[str, Any], str]]:
+        """
+        通过一次 (prefab_id, version) IN 查询批量读取规格（内部方法，由调用方负责回写 L1）
+        
+        Returns:
+            以 (prefab_id, version) 为键的 (规格字典, 原始 JSON 文本)，不存在的键不出现在结果中
+        """
+        try:
+            result = await db.execute(
+                select(
+                    PrefabSpec.id,
+                    PrefabSpec.prefab_id,
+                    PrefabSpec.version,
+                    type_coerce(PrefabSpec.spec_json, Text)
+                ).where(tuple_(PrefabSpec.prefab_id, PrefabSpec.version).in_(pairs))
+            )
+        except Exception as e:
+            logger.error(f"Error getting specs from database: {e}")
+            return {}
+        
+        now = datetime.utcnow()
+        loaded: Dict[Tuple[str, str], Tuple[Dict[str, Any], str]] = {}
+        for spec_id, prefab_id, version, spec_raw in result:
+            # 记录调用统计（由后台任务批量落库）
+            count, _ = self._pending_stats.get(spec_id, (0, None))
+            self._pending_stats[spec_id] = (count + 1, now)
+            loaded[(prefab_id, version)] = (orjson.loads(spec_raw), spec_raw)
+        
+        for prefab_id, version in pairs:
+            if (prefab_id, version) not in loaded:
+                self._negative_cache[self._make_key(prefab_id, version)] = True
+        
+        logger.debug(f"Spec cache batch HIT (L2-db): {len(loaded)}/{len(pairs)}")
+        return loaded
+    
+    async def flush_call_stats(self) -> None:
+        """将累计的调用统计一次性写入数据库（单个事务，executemany）"""
+        if not self._pending_stats:
+            return
+        pending, self._pending_stats = self._pending_stats, {}
+        
+        table = PrefabSpec.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("spec_id"))
+            .values(
+                call_count=table.c.call_count + bindparam("calls"),
+                last_called_at=bindparam("called_at")
+            )
+        )
+        params = [
+            {"spec_id": spec_id, "calls": calls, "called_at": called_at}
+            for spec_id, (calls, called_at) in pending.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, params)
+                await db.commit()
+            logger.debug(f"Flushed call stats for {len(params)} specs")
+        except Exception as e:
+            logger.warning(f"Failed to flush spec call stats ({len(params)} specs): {e}")
+    
+    async def start_stats_flush_daemon(self, interval_seconds: int = 5) -> None:
+        """
+        启动调用统计落库守护任务
+        
+        Args:
+            interval_seconds: 落库间隔（默认 5 秒）
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval_seconds)
+                await self.flush_call_stats()
+        finally:
+            # 退出（取消）前写入剩余统计
+            await self.flush_call_stats()
+    
     async def set_spec(
         self,
         prefab_id: str,
@@ -160,46 +445,37 @@ class SpecCacheService:
         key = self._make_key(prefab_id, version)
         
         try:
-            # L2: 写入数据库（或更新）
-            stmt = select(PrefabSpec).where(
-                and_(
-                    PrefabSpec.prefab_id == prefab_id,
-                    PrefabSpec.version == version
-                )
-            )
-            result = await db.execute(stmt)
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                # 更新现有记录
-                existing.spec_json = spec
-                existing.updated_at = datetime.utcnow()
-                if knative_service_url:
-                    existing.knative_service_url = knative_service_url
-                if deployment_status:
-                    existing.deployment_status = deployment_status
-                if artifact_url:
-                    existing.artifact_url = artifact_url
-                if deployment_status == DeploymentStatus.DEPLOYED:
-                    existing.deployed_at = datetime.utcnow()
-                logger.info(f"Updated spec in DB: {key}")
-            else:
-                # 创建新记录
-                new_spec = PrefabSpec(
-                    prefab_id=prefab_id,
-                    version=version,
-                    spec_json=spec,
-                    knative_service_url=knative_service_url,
-                    deployment_status=deployment_status,
-                    artifact_url=artifact_url
-                )
-                db.add(new_spec)
-                logger.info(f"Created spec in DB: {key}")
+            # 只序列化一次，同一份 JSON 文本同时写入 MySQL 和 Redis
+            spec_raw = orjson.dumps(spec).decode('utf-8')
             
+            # L2: 单条 upsert 写入数据库，依赖 (prefab_id, version) 唯一索引
+            now = datetime.utcnow()
+            stmt = mysql_insert(PrefabSpec).values(
+                prefab_id=prefab_id,
+                version=version,
+                spec_json=type_coerce(spec_raw, Text),
+                knative_service_url=knative_service_url,
+                deployment_status=deployment_status,
+                artifact_url=artifact_url
+            )
+            update_values = {
+                "spec_json": stmt.inserted.spec_json,
+                "updated_at": now,
+            }
+            if knative_service_url:
+                update_values["knative_service_url"] = stmt.inserted.knative_service_url
+            if deployment_status:
+                update_values["deployment_status"] = stmt.inserted.deployment_status
+            if artifact_url:
+                update_values["artifact_url"] = stmt.inserted.artifact_url
+            if deployment_status == DeploymentStatus.DEPLOYED:
+                update_values["deployed_at"] = now
+            await db.execute(stmt.on_duplicate_key_update(**update_values))
             await db.commit()
+            logger.info(f"Stored spec in DB: {key}")
             
             # L1: 写入 Redis
-            await self._set_redis_cache(key, spec)
+            await self._set_redis_cache(key, spec, spec_raw)
             
             return True
             
@@ -208,15 +484,73 @@ class SpecCacheService:
             await db.rollback()
             return False
     
-    async def _set_redis_cache(self, key: str, spec: Dict[str, Any]) -> None:
+    def _build_cached_spec(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        构建进程内缓存（L0 / 内存回退）中的规格
+        
+        预建函数索引，读取方按函数名 O(1) 查找；同时预计算每个函数的文件参数
+        （仅存在于进程内，Redis 与数据库中保存原始 manifest）
+        """
+        functions = [
+            {
+                **func,
+                INPUT_FILES_FIELD: self.input_file_params(func),
+                OUTPUT_FILES_FIELD: self.output_file_fields(func),
+            }
+            for func in spec.get("functions", [])
+        ]
+        return {
+            **spec,
+            "functions": functions,
+            FUNCTION_INDEX_FIELD: {
+                func.get("name"): position
+                for position, func in enumerate(functions)
+            }
+        }
+    
+    async def _set_redis_cache(
+        self,
+        key: str,
+        spec: Dict[str, Any],
+        spec_raw: Optional[str] = None,
+        only_if_absent: bool = False
+    ) -> None:
         """写入 Redis 缓存（内部方法）"""
+        await self._set_redis_cache_many([(key, spec, spec_raw)], only_if_absent)
+    
+    async def _set_redis_cache_many(
+        self,
+        items: List[Tuple[str, Dict[str, Any], Optional[str]]],
+        only_if_absent: bool = False
+    ) -> None:
+        """
+        批量写入 Redis 缓存，多个键通过一次 pipeline 提交（内部方法）
+        
+        Args:
+            items: (缓存键, 规格字典, 原始 JSON 文本) 列表；已有原始文本时直接写入，不再序列化
+            only_if_absent: 仅在键不存在时写入（读路径回写使用，不会覆盖删除时留下的墓碑）
+        """
+        for key, _, _ in items:
+            self._negative_cache.pop(key, None)
+            self._l0.pop(key, None)
         try:
             if self._use_memory:
-                self._memory_cache[key] = spec
+                for key, spec, _ in items:
+                    self._memory_cache[key] = self._build_cached_spec(spec)
             else:
                 if self._redis:
-                    spec_json_str = json.dumps(spec)
-                    await self._redis.setex(key, self._redis_ttl, spec_json_str)
+                    async with self._redis.pipeline(transaction=False) as pipe:
+                        for key, spec, spec_raw in items:
+                            pipe.set(
+                                key,
+                                spec_raw if spec_raw is not None else orjson.dumps(spec),
+                                ex=self._redis_ttl,
+                                nx=only_if_absent
+                            )
+                        await pipe.execute()
+            # L1 写入成功后再填充 L0
+            for key, spec, _ in items:
+                self._l0[key] = self._memory_cache[key] if self._use_memory else self._build_cached_spec(spec)
         except Exception as e:
             logger.warning(f"Failed to set Redis cache: {e}")
     
@@ -227,7 +561,10 @@ class SpecCacheService:
         db: AsyncSession
     ) -> bool:
         """
-        删除缓存的规格（双层删除）
+        删除缓存的规格（按序失效：L0 → L1 墓碑 → L2）
+        
+        先在 Redis 中写入短期墓碑再删除数据库记录：墓碑存活期间读路径视为未命中，
+        且回写只在键不存在时生效，避免并发读者把已删除的记录重新写回 L1
         
         Args:
             prefab_id: 预制件 ID
@@ -239,37 +576,47 @@ class SpecCacheService:
         """
         key = self._make_key(prefab_id, version)
         deleted = False
+        self._l0.pop(key, None)
         
+        # L1: 先失效（Redis 写入墓碑，内存模式直接删除）
+        tombstoned = False
         try:
-            # L2: 从数据库删除
-            stmt = select(PrefabSpec).where(
-                and_(
+            if self._use_memory:
+                self._memory_cache.pop(key, None)
+            elif self._redis:
+                await self._redis.setex(key, _TOMBSTONE_TTL, _TOMBSTONE)
+                tombstoned = True
+        except Exception as e:
+            logger.warning(f"Failed to set Redis tombstone: {e}")
+        
+        try:
+            # L2: 单条 DELETE 删除数据库记录，按影响行数判断是否存在
+            result = await db.execute(
+                delete(PrefabSpec).where(
                     PrefabSpec.prefab_id == prefab_id,
                     PrefabSpec.version == version
                 )
             )
-            result = await db.execute(stmt)
-            record = result.scalar_one_or_none()
+            await db.commit()
             
-            if record:
-                await db.delete(record)
-                await db.commit()
+            if result.rowcount:
                 logger.info(f"Deleted spec from DB: {key}")
+                self._l0.pop(key, None)
+                self._negative_cache[key] = True
                 deleted = True
             
-            # L1: 从 Redis 删除
-            if self._use_memory:
-                if key in self._memory_cache:
-                    del self._memory_cache[key]
-            else:
-                if self._redis:
-                    await self._redis.delete(key)
-            
+            # 墓碑保留至自然过期，期间并发读者不会把旧记录写回 L1
             return deleted
             
         except Exception as e:
             logger.error(f"Error deleting spec: {e}")
             await db.rollback()
+            # 数据库记录仍然存在，撤销墓碑以恢复 L1 缓存
+            if tombstoned:
+                try:
+                    await self._redis.delete(key)
+                except Exception as redis_error:
+                    logger.warning(f"Failed to clear Redis tombstone: {redis_error}")
             return False
     
     async def update_deployment_status(
@@ -298,52 +645,50 @@ class SpecCacheService:
             True 如果成功，False 否则
         """
         try:
-            stmt = select(PrefabSpec).where(
-                and_(
-                    PrefabSpec.prefab_id == prefab_id,
-                    PrefabSpec.version == version
-                )
+            # 单条 upsert：记录不存在时插入（首次部署），存在时只更新本次提供的字段
+            now = datetime.utcnow()
+            deployed_at = now if status == DeploymentStatus.DEPLOYED else None
+            stmt = mysql_insert(PrefabSpec).values(
+                prefab_id=prefab_id,
+                version=version,
+                spec_json=manifest or {},
+                knative_service_url=knative_service_url,
+                deployment_status=status,
+                deployment_error=error_message,
+                deployed_at=deployed_at
             )
-            result = await db.execute(stmt)
-            record = result.scalar_one_or_none()
+            update_values: Dict[str, Any] = {
+                "deployment_status": stmt.inserted.deployment_status,
+                "updated_at": now,
+            }
             
-            if record:
-                # 更新现有记录
-                record.deployment_status = status
-                record.updated_at = datetime.utcnow()
-                
-                if knative_service_url:
-                    record.knative_service_url = knative_service_url
-                
-                if manifest:
-                    record.spec_json = manifest
-                
-                if error_message:
-                    record.deployment_error = error_message
-                
-                if status == DeploymentStatus.DEPLOYED:
-                    record.deployed_at = datetime.utcnow()
-                    record.deployment_error = None  # 清除之前的错误
-                
-                logger.info(f"Updated deployment status: {prefab_id}:{version} → {status.value}")
+            if knative_service_url:
+                update_values["knative_service_url"] = stmt.inserted.knative_service_url
+            
+            if manifest:
+                update_values["spec_json"] = stmt.inserted.spec_json
+            
+            if error_message:
+                update_values["deployment_error"] = stmt.inserted.deployment_error
+            
+            if status == DeploymentStatus.DEPLOYED:
+                update_values["deployed_at"] = stmt.inserted.deployed_at
+                update_values["deployment_error"] = None  # 清除之前的错误
+            
+            result = await db.execute(stmt.on_duplicate_key_update(**update_values))
+            
+            # MySQL 对 upsert 的影响行数：1 表示插入新记录，2 表示更新了已有记录
+            if result.rowcount == 1:
+                logger.info(f"Created new spec with status: {prefab_id}:{version} → {status.label}")
             else:
-                # 创建新记录（首次部署）
-                new_record = PrefabSpec(
-                    prefab_id=prefab_id,
-                    version=version,
-                    spec_json=manifest or {},
-                    knative_service_url=knative_service_url,
-                    deployment_status=status,
-                    deployment_error=error_message,
-                    deployed_at=datetime.utcnow() if status == DeploymentStatus.DEPLOYED else None
-                )
-                db.add(new_record)
-                logger.info(f"Created new spec with status: {prefab_id}:{version} → {status.value}")
+                logger.info(f"Updated deployment status: {prefab_id}:{version} → {status.label}")
             
             await db.commit()
             
-            # 使 Redis 缓存失效（下次查询时会从数据库重新加载）
+            # 使 L0/Redis 缓存失效（下次查询时会从数据库重新加载）
             key = self._make_key(prefab_id, version)
+            self._l0.pop(key, None)
+            self._negative_cache.pop(key, None)
             if self._use_memory:
                 self._memory_cache.pop(key, None)
             else:
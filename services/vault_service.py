@@ -3,17 +3,46 @@
 
 负责存储和检索用户的密钥（加密存储到数据库）
 """
+import asyncio
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from datetime import datetime
-from sqlalchemy import select, and_
+from sqlalchemy import select, bindparam, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import UserSecret, SecretStatus
+from db.session import AsyncSessionLocal
 from services.encryption import encryption_service
 
 logger = logging.getLogger(__name__)
 
+# 密文/明文总长度超过该值时才放到线程池加解密；
+# 常见的短密钥直接执行，线程切换的开销比加解密本身还大
+_OFFLOAD_THRESHOLD = 4 * 1024
+
+# 热路径查询语句，模块加载时构建一次，执行时只绑定参数
+_SECRET_BY_KEY = select(UserSecret).where(
+    UserSecret.user_id == bindparam("user_id"),
+    UserSecret.prefab_id == bindparam("prefab_id"),
+    UserSecret.secret_name == bindparam("secret_name")
+)
+_ACTIVE_SECRET_BY_KEY = _SECRET_BY_KEY.where(UserSecret.status == SecretStatus.ACTIVE)
+_ACTIVE_SECRETS_BY_NAMES = select(UserSecret).where(
+    UserSecret.user_id == bindparam("user_id"),
+    UserSecret.prefab_id == bindparam("prefab_id"),
+    UserSecret.secret_name.in_(bindparam("secret_names", expanding=True)),
+    UserSecret.status == SecretStatus.ACTIVE
+)
+
+# list_secrets 的基础查询（只取两列，由 idx_user_status_prefab_secret 覆盖），模块加载时构建一次
+_LIST_SECRETS_STMT = select(UserSecret.prefab_id, UserSecret.secret_name).where(
+    UserSecret.user_id == bindparam("user_id"),
+    UserSecret.status == SecretStatus.ACTIVE
+)
+
 
 class VaultService:
     """
@@ -24,8 +53,32 @@ class VaultService:
     
     def __init__(self) -> None:
         self.encryption = encryption_service
+        # 加解密专用线程池（cryptography 在 OpenSSL 调用期间释放 GIL）
+        self._crypto_pool = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 4,
+            thread_name_prefix="vault-crypto"
+        )
+        # 待落库的最后使用时间：{UserSecret.id: last_used_at}，由后台任务定期批量写入
+        self._pending_last_used: dict[int, datetime] = {}
         logger.info("VaultService initialized (database + encryption mode)")
     
+    async def _encrypt(self, plaintext: str) -> bytes:
+        """加密单个值为二进制密文，较大的值在线程池中执行"""
+        if len(plaintext) <= _OFFLOAD_THRESHOLD:
+            return self.encryption.encrypt_bytes(plaintext)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._crypto_pool, self.encryption.encrypt_bytes, plaintext)
+    
+    async def _decrypt_many(self, ciphertexts: list[bytes]) -> list[str]:
+        """批量解密，总长度较大时整批放到线程池执行（只切换一次线程）"""
+        if sum(len(ciphertext) for ciphertext in ciphertexts) <= _OFFLOAD_THRESHOLD:
+            return [self.encryption.decrypt_bytes(ciphertext) for ciphertext in ciphertexts]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._crypto_pool,
+            lambda: [self.encryption.decrypt_bytes(ciphertext) for ciphertext in ciphertexts]
+        )
+    
     async def store_secret(
         self,
         user_id: str,
@@ -47,41 +100,27 @@ class VaultService:
             description: 可选的密钥描述
         """
         # 加密密钥值
-        encrypted_value = self.encryption.encrypt(secret_value)
+        encrypted_value = await self._encrypt(secret_value)
         
-        # 查找是否已存在
-        stmt = select(UserSecret).where(
-            and_(
-                UserSecret.user_id == user_id,
-                UserSecret.prefab_id == prefab_id,
-                UserSecret.secret_name == secret_name
-            )
+        # 单条 upsert：依赖 (user_id, prefab_id, secret_name) 唯一索引，已存在则更新
+        stmt = mysql_insert(UserSecret).values(
+            user_id=user_id,
+            prefab_id=prefab_id,
+            secret_name=secret_name,
+            secret_value=encrypted_value,
+            description=description,
+            status=SecretStatus.ACTIVE
         )
-        result = await db.execute(stmt)
-        existing = result.scalar_one_or_none()
-        
-        if existing:
-            # 更新现有密钥
-            existing.secret_value = encrypted_value
-            existing.updated_at = datetime.utcnow()
-            existing.status = SecretStatus.ACTIVE
-            if description:
-                existing.description = description
-            logger.info(f"Updated secret: user={user_id}, prefab={prefab_id}, name={secret_name}")
-        else:
-            # 创建新密钥
-            new_secret = UserSecret(
-                user_id=user_id,
-                prefab_id=prefab_id,
-                secret_name=secret_name,
-                secret_value=encrypted_value,
-                description=description,
-                status=SecretStatus.ACTIVE
-            )
-            db.add(new_secret)
-            logger.info(f"Created secret: user={user_id}, prefab={prefab_id}, name={secret_name}")
-        
+        update_values = {
+            "secret_value": stmt.inserted.secret_value,
+            "status": stmt.inserted.status,
+            "updated_at": datetime.utcnow(),
+        }
+        if description:
+            update_values["description"] = stmt.inserted.description
+        await db.execute(stmt.on_duplicate_key_update(**update_values))
         await db.commit()
+        logger.info(f"Stored secret: user={user_id}, prefab={prefab_id}, name={secret_name}")
     
     async def get_secret(
         self,
@@ -102,30 +141,67 @@ class VaultService:
         Returns:
             密钥值（明文），如果不存在返回 None
         """
-        stmt = select(UserSecret).where(
-            and_(
-                UserSecret.user_id == user_id,
-                UserSecret.prefab_id == prefab_id,
-                UserSecret.secret_name == secret_name,
-                UserSecret.status == SecretStatus.ACTIVE
-            )
+        result = await db.execute(
+            _ACTIVE_SECRET_BY_KEY,
+            {"user_id": user_id, "prefab_id": prefab_id, "secret_name": secret_name}
         )
-        result = await db.execute(stmt)
         secret_record = result.scalar_one_or_none()
         
         if secret_record:
-            # 更新最后使用时间
-            secret_record.last_used_at = datetime.utcnow()
-            await db.commit()
+            # 记录最后使用时间（由后台任务批量落库）
+            self._pending_last_used[secret_record.id] = datetime.utcnow()
             
             # 解密并返回
-            plaintext = self.encryption.decrypt(secret_record.secret_value)
+            plaintext = (await self._decrypt_many([secret_record.secret_value]))[0]
             logger.debug(f"Retrieved secret: user={user_id}, prefab={prefab_id}, name={secret_name}")
             return plaintext
         else:
             logger.warning(f"Secret not found: user={user_id}, prefab={prefab_id}, name={secret_name}")
             return None
     
+    async def get_secrets_bulk(
+        self,
+        user_id: str,
+        prefab_id: str,
+        secret_names: list[str],
+        db: AsyncSession
+    ) -> dict[str, str]:
+        """
+        批量获取密钥（一次查询读取并解密）
+        
+        Args:
+            user_id: 用户 ID
+            prefab_id: 预制件 ID
+            secret_names: 密钥名称列表
+            db: 数据库会话
+        
+        Returns:
+            {密钥名称: 明文值}，不存在的密钥不包含在结果中
+        """
+        if not secret_names:
+            return {}
+        
+        result = await db.execute(
+            _ACTIVE_SECRETS_BY_NAMES,
+            {"user_id": user_id, "prefab_id": prefab_id, "secret_names": secret_names}
+        )
+        secret_records = result.scalars().all()
+        
+        if not secret_records:
+            return {}
+        
+        # 记录最后使用时间（由后台任务批量落库）
+        now = datetime.utcnow()
+        for secret_record in secret_records:
+            self._pending_last_used[secret_record.id] = now
+        
+        logger.debug(f"Retrieved {len(secret_records)} secrets: user={user_id}, prefab={prefab_id}")
+        plaintexts = await self._decrypt_many([secret_record.secret_value for secret_record in secret_records])
+        return {
+            secret_record.secret_name: plaintext
+            for secret_record, plaintext in zip(secret_records, plaintexts)
+        }
+    
     async def delete_secret(
         self,
         user_id: str,
@@ -145,20 +221,21 @@ class VaultService:
         Returns:
             True 如果成功删除，False 如果密钥不存在
         """
-        stmt = select(UserSecret).where(
-            and_(
+        # 单条 UPDATE 完成软删除，按匹配行数判断密钥是否存在（无需先加载 ORM 对象）
+        stmt = (
+            update(UserSecret)
+            .where(
                 UserSecret.user_id == user_id,
                 UserSecret.prefab_id == prefab_id,
                 UserSecret.secret_name == secret_name
             )
+            .values(status=SecretStatus.DISABLED, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
         )
         result = await db.execute(stmt)
-        secret_record = result.scalar_one_or_none()
+        await db.commit()
         
-        if secret_record:
-            secret_record.status = SecretStatus.DISABLED
-            secret_record.updated_at = datetime.utcnow()
-            await db.commit()
+        if result.rowcount:
             logger.info(f"Deleted secret: user={user_id}, prefab={prefab_id}, name={secret_name}")
             return True
         return False
@@ -180,18 +257,52 @@ class VaultService:
         Returns:
             (prefab_id, secret_name) 元组列表
         """
-        stmt = select(UserSecret.prefab_id, UserSecret.secret_name).where(
-            and_(
-                UserSecret.user_id == user_id,
-                UserSecret.status == SecretStatus.ACTIVE
-            )
-        )
-        
+        stmt = _LIST_SECRETS_STMT
         if prefab_id:
             stmt = stmt.where(UserSecret.prefab_id == prefab_id)
         
-        result = await db.execute(stmt)
-        return [(row[0], row[1]) for row in result.all()]
+        result = await db.execute(stmt, {"user_id": user_id})
+        # 行对象本身即可按元组解包，无需逐行重建
+        return list(result.tuples())
+    
+    async def flush_last_used(self) -> None:
+        """将累计的最后使用时间一次性写入数据库（单个事务，executemany）"""
+        if not self._pending_last_used:
+            return
+        pending, self._pending_last_used = self._pending_last_used, {}
+        
+        table = UserSecret.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("secret_id"))
+            .values(last_used_at=bindparam("used_at"))
+        )
+        params = [
+            {"secret_id": secret_id, "used_at": used_at}
+            for secret_id, used_at in pending.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, params)
+                await db.commit()
+            logger.debug(f"Flushed last_used_at for {len(params)} secrets")
+        except Exception as e:
+            logger.warning(f"Failed to flush secret last_used_at ({len(params)} secrets): {e}")
+    
+    async def start_usage_flush_daemon(self, interval_seconds: int = 5) -> None:
+        """
+        启动最后使用时间落库守护任务
+        
+        Args:
+            interval_seconds: 落库间隔（默认 5 秒）
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval_seconds)
+                await self.flush_last_used()
+        finally:
+            # 退出（取消）前写入剩余记录
+            await self.flush_last_used()
 
 
 # 全局单例
@@ -1,33 +1,72 @@
 """
 Pytest 配置和 fixtures
 """
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+import jwt
 from datetime import datetime, timedelta
 
 from app.main import app
 from config.settings import settings
+from db.session import AsyncSessionLocal, engine, get_db, get_readonly_db
 from services import vault_service, acl_service, spec_cache_service
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """测试客户端"""
-    return TestClient(app)
+    """测试客户端（整个测试会话只运行一次应用生命周期，共享 Redis/数据库连接）"""
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 @pytest.fixture
+def transactional_db(client):
+    """
+    事务隔离的数据库会话（供有写入的测试使用）
+    
+    请求内的提交只释放 SAVEPOINT，测试结束时回滚外层事务，无需重新建立连接
+    """
+    async def begin():
+        conn = await engine.connect()
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint")
+        return conn, trans, session
+    
+    async def rollback():
+        await session.close()
+        await trans.rollback()
+        await conn.close()
+    
+    # 连接必须建立在应用所在的事件循环上
+    conn, trans, session = client.portal.call(begin)
+    
+    async def override_get_db():
+        yield session
+    
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_readonly_db] = override_get_db
+    
+    yield session
+    
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_readonly_db, None)
+    client.portal.call(rollback)
+
+
+@pytest.fixture(scope="session")
 def test_user_id():
     """测试用户 ID"""
     return "test-user-123"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_token(test_user_id):
-    """生成测试 JWT token"""
+    """生成测试 JWT token（整个测试会话只签名一次，有效期覆盖整个会话）"""
     payload = {
         "sub": test_user_id,
+        "aud": "prefab-gateway",
         "username": "testuser",
         "scopes": ["prefab:execute", "prefab:read"],
         "exp": datetime.utcnow() + timedelta(minutes=30)
@@ -36,14 +75,14 @@ def test_token(test_user_id):
     return token
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def auth_headers(test_token):
     """认证请求头"""
     return {"Authorization": f"Bearer {test_token}"}
 
 
-@pytest.fixture
-async def sample_spec():
+@pytest.fixture(scope="session")
+def sample_spec():
     """示例预制件规格"""
     return {
         "id": "test-prefab",
@@ -75,11 +114,17 @@ async def sample_spec():
     }
 
 
-@pytest.fixture(autouse=True)
-async def setup_test_data(sample_spec):
-    """每个测试前设置测试数据"""
-    # 缓存测试规格
-    await spec_cache_service.set_spec("test-prefab", "1.0.0", sample_spec)
+@pytest.fixture(scope="session", autouse=True)
+def setup_test_data(sample_spec):
+    """测试会话开始时设置一次测试数据（测试只读取这些数据）"""
+    async def seed() -> None:
+        # 缓存测试规格
+        async with AsyncSessionLocal() as db:
+            await spec_cache_service.set_spec("test-prefab", "1.0.0", sample_spec, db)
+        # 释放在临时事件循环上建立的连接，避免应用生命周期的事件循环复用它们
+        await engine.dispose()
+    
+    asyncio.run(seed())
     
     yield
     
@@ -0,0 +1,51 @@
+"""
+访问控制服务测试
+"""
+import pytest
+
+from services.acl_service import AccessControlService
+
+
+@pytest.fixture
+def acl():
+    """独立的访问控制服务实例（不与全局单例共享状态）"""
+    return AccessControlService()
+
+
+def test_grant_ownership_evicts_cached_denial(acl):
+    """授予所有权后，之前缓存的拒绝结果立即失效"""
+    s3_uri = "s3://bucket/user-1/report.pdf"
+
+    assert not acl.can_read_nowait("user-1", s3_uri)
+    assert ("user-1", s3_uri) in acl._neg
+
+    acl.grant_ownership_nowait("user-1", s3_uri)
+
+    assert acl.can_read_nowait("user-1", s3_uri)
+
+
+def test_grant_ownership_many_evicts_cached_denials(acl):
+    """批量授予所有权同样清除各文件的拒绝缓存"""
+    s3_uris = ["s3://bucket/user-1/a.txt", "s3://bucket/user-1/b.txt"]
+
+    for s3_uri in s3_uris:
+        assert not acl.can_read_nowait("user-1", s3_uri)
+
+    acl.grant_ownership_many_nowait("user-1", s3_uris)
+
+    for s3_uri in s3_uris:
+        assert acl.can_read_nowait("user-1", s3_uri)
+    # 其他用户的拒绝不受影响
+    assert not acl.can_read_nowait("user-2", s3_uris[0])
+
+
+@pytest.mark.asyncio
+async def test_async_grant_ownership_evicts_cached_denial(acl):
+    """异步接口授予所有权后，之前缓存的拒绝结果立即失效"""
+    s3_uri = "s3://bucket/user-1/output.json"
+
+    assert not await acl.can_read("user-1", s3_uri)
+
+    await acl.grant_ownership("user-1", s3_uri)
+
+    assert await acl.can_read("user-1", s3_uri)
@@ -1,9 +1,17 @@
 """
 认证和授权测试
 """
+import hashlib
+import math
+import time
+
+import jwt
 import pytest
 from fastapi import status
 
+from app.dependencies import auth
+from config.settings import settings
+
 
 def test_health_check_no_auth(client):
     """健康检查端点不需要认证"""
@@ -25,9 +33,58 @@ def test_run_with_invalid_token(client):
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+def test_run_with_malformed_token(client):
+    """结构不合法或超长的 token 应该在验签前被拒绝"""
+    for token in ["a.b.c.d", "a" * 9000 + ".b.c", "a" * 2000 + ".b.c"]:
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post("/v1/run", json={"calls": []}, headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
 def test_run_with_valid_token(client, auth_headers):
     """有效 token 应该通过认证"""
     response = client.post("/v1/run", json={"calls": []}, headers=auth_headers)
     # 空调用列表也应该返回 200（不是认证错误）
     assert response.status_code == status.HTTP_200_OK
 
+
+def _make_token(user_id, exp):
+    """生成指定过期时间的测试 JWT token"""
+    payload = {"sub": user_id, "aud": "prefab-gateway", "exp": exp}
+    return jwt.encode(payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+def _cached_expiry(token):
+    """读取认证缓存中该 token 的失效时间戳"""
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    return auth._user_cache[cache_key][1]
+
+
+def test_token_cache_capped_by_ttl_and_exp():
+    """认证缓存的失效时间为 min(exp, now + USER_CACHE_TTL)"""
+    now = time.time()
+    
+    long_lived = _make_token("cache-user-long", int(now) + 3600)
+    assert auth.authenticate_token(long_lived) is not None
+    assert _cached_expiry(long_lived) <= time.time() + auth.USER_CACHE_TTL
+    
+    short_exp = int(now) + 5
+    short_lived = _make_token("cache-user-short", short_exp)
+    assert auth.authenticate_token(short_lived) is not None
+    assert _cached_expiry(short_lived) == short_exp
+
+
+def test_expired_token_not_served_from_cache(client):
+    """token 过期后即使仍在缓存 TTL 内也应返回 401"""
+    # 向上取整再留出 2 秒，保证首个请求时 token 一定尚未过期
+    exp = math.ceil(time.time()) + 2
+    headers = {"Authorization": f"Bearer {_make_token('cache-user-expiring', exp)}"}
+    
+    response = client.post("/v1/run", json={"calls": []}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    
+    # 等待越过 exp（仍远小于 USER_CACHE_TTL）
+    time.sleep(max(0.0, exp - time.time()) + 0.1)
+    
+    response = client.post("/v1/run", json={"calls": []}, headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,162 @@
+"""
+加密服务测试
+"""
+import base64
+import os
+import struct
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+from config.settings import settings
+from services.encryption import EncryptionService
+
+# 与 encrypt_file 的分块格式一致：4 字节大端长度前缀 + 令牌
+_LENGTH = struct.Struct(">I")
+_CHUNK_SIZE = 1024
+
+
+@pytest.fixture
+def encryption():
+    """加密服务实例"""
+    return EncryptionService()
+
+
+def _split_chunks(data: bytes) -> list[bytes]:
+    """按长度前缀拆分加密文件中的分块令牌"""
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        chunks.append(data[offset:offset + length])
+        offset += length
+    return chunks
+
+
+def _join_chunks(chunks: list[bytes]) -> bytes:
+    """将分块令牌重新拼接为加密文件内容"""
+    return b"".join(_LENGTH.pack(len(chunk)) + chunk for chunk in chunks)
+
+
+def _encrypt_to(encryption, tmp_path, plaintext: bytes) -> bytes:
+    """加密明文并返回密文文件内容"""
+    src = tmp_path / "plain.bin"
+    dst = tmp_path / "cipher.bin"
+    src.write_bytes(plaintext)
+    encryption.encrypt_file(src, dst, chunk_size=_CHUNK_SIZE)
+    return dst.read_bytes()
+
+
+def _decrypt_bytes(encryption, tmp_path, ciphertext: bytes):
+    """解密密文文件内容，返回 (明文, 输出路径)"""
+    src = tmp_path / "tampered.bin"
+    dst = tmp_path / "out.bin"
+    src.write_bytes(ciphertext)
+    encryption.decrypt_file(src, dst)
+    return dst.read_bytes(), dst
+
+
+def test_file_round_trip_multiple_chunks(encryption, tmp_path):
+    """多块文件加密后可以完整解密"""
+    plaintext = os.urandom(_CHUNK_SIZE * 3 + 17)
+    ciphertext = _encrypt_to(encryption, tmp_path, plaintext)
+
+    assert len(_split_chunks(ciphertext)) == 4
+    decrypted, _ = _decrypt_bytes(encryption, tmp_path, ciphertext)
+    assert decrypted == plaintext
+
+
+def test_file_round_trip_empty(encryption, tmp_path):
+    """空文件加密为单个末块，解密后仍为空"""
+    ciphertext = _encrypt_to(encryption, tmp_path, b"")
+
+    assert len(_split_chunks(ciphertext)) == 1
+    decrypted, _ = _decrypt_bytes(encryption, tmp_path, ciphertext)
+    assert decrypted == b""
+
+
+def test_file_truncated(encryption, tmp_path):
+    """截掉末块或截断在令牌中间都应解密失败，且不留下输出文件"""
+    chunks = _split_chunks(_encrypt_to(encryption, tmp_path, os.urandom(_CHUNK_SIZE * 3)))
+
+    for truncated in (_join_chunks(chunks[:-1]), _join_chunks(chunks)[:-10]):
+        with pytest.raises(InvalidToken):
+            _decrypt_bytes(encryption, tmp_path, truncated)
+        assert not (tmp_path / "out.bin").exists()
+
+
+def test_file_reordered_chunks(encryption, tmp_path):
+    """交换分块顺序应解密失败"""
+    chunks = _split_chunks(_encrypt_to(encryption, tmp_path, os.urandom(_CHUNK_SIZE * 3)))
+    chunks[0], chunks[1] = chunks[1], chunks[0]
+
+    with pytest.raises(InvalidToken):
+        _decrypt_bytes(encryption, tmp_path, _join_chunks(chunks))
+
+
+def test_file_tampered_byte(encryption, tmp_path):
+    """篡改任一密文字节应解密失败"""
+    ciphertext = bytearray(_encrypt_to(encryption, tmp_path, os.urandom(_CHUNK_SIZE * 2)))
+    ciphertext[_LENGTH.size + 40] ^= 0x01
+
+    with pytest.raises(InvalidToken):
+        _decrypt_bytes(encryption, tmp_path, bytes(ciphertext))
+
+
+def test_secret_round_trip_aesgcm(monkeypatch):
+    """默认生成 "v2:" AES-GCM 密文，并可解密"""
+    monkeypatch.setattr(settings, "SECRET_CIPHER", "aesgcm")
+    encryption = EncryptionService()
+    token = encryption.encrypt("sk-test-12345")
+
+    assert token.startswith("v2:")
+    assert encryption.decrypt(token) == "sk-test-12345"
+
+
+def test_decrypt_existing_fernet_token(encryption):
+    """切换到 AES-GCM 之前保存的 Fernet 令牌仍可解密"""
+    token = encryption.fernet.encrypt("sk-legacy".encode("utf-8")).decode("ascii")
+
+    assert encryption.decrypt(token) == "sk-legacy"
+
+
+def test_secret_cipher_fernet(monkeypatch):
+    """SECRET_CIPHER=fernet 时生成 Fernet 令牌"""
+    monkeypatch.setattr(settings, "SECRET_CIPHER", "fernet")
+    encryption = EncryptionService()
+    token = encryption.encrypt("sk-test-12345")
+
+    assert not token.startswith("v2:")
+    assert encryption.fernet.decrypt(token.encode("ascii")) == b"sk-test-12345"
+    assert encryption.decrypt(token) == "sk-test-12345"
+
+
+def test_tampered_aesgcm_token_rejected(monkeypatch):
+    """篡改 "v2:" 密文应解密失败"""
+    monkeypatch.setattr(settings, "SECRET_CIPHER", "aesgcm")
+    encryption = EncryptionService()
+    token = encryption.encrypt("sk-test-12345")
+    blob = bytearray(base64.urlsafe_b64decode(token[len("v2:"):]))
+    blob[-1] ^= 0x01
+    tampered = "v2:" + base64.urlsafe_b64encode(bytes(blob)).decode("ascii")
+
+    with pytest.raises(InvalidToken):
+        encryption.decrypt(tampered)
+
+
+def test_rfernet_invalid_token(monkeypatch):
+    """启用 rfernet 时，篡改或格式错误的 Fernet 令牌同样抛出 InvalidToken"""
+    pytest.importorskip("rfernet")
+    monkeypatch.setattr(settings, "USE_RFERNET", True)
+    monkeypatch.setattr(settings, "SECRET_CIPHER", "fernet")
+    encryption = EncryptionService()
+    assert encryption._rfernet is not None
+
+    token = encryption.encrypt("sk-test-12345")
+    assert encryption.decrypt(token) == "sk-test-12345"
+
+    tampered = token[:-2] + ("A" if token[-2] != "A" else "B") + token[-1]
+    for bad_token in (tampered, "gAAAAABbad"):
+        with pytest.raises(InvalidToken):
+            encryption.decrypt(bad_token)
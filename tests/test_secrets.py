@@ -4,6 +4,9 @@
 import pytest
 from fastapi import status
 
+# 每个测试的写入在结束时回滚，测试之间互不影响
+pytestmark = pytest.mark.usefixtures("transactional_db")
+
 
 def test_store_secret(client, auth_headers, test_user_id):
     """测试存储密钥"""
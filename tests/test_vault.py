@@ -0,0 +1,101 @@
+"""
+密钥保管库读取路径测试（二进制 / "v2:" 文本 / 旧 Fernet 三种存储格式）
+"""
+import pytest
+from cryptography.fernet import InvalidToken
+
+from config.settings import settings
+from db.models import UserSecret
+from services.encryption import EncryptionService
+from services.vault_service import VaultService
+
+
+class _Result:
+    """模拟查询结果（只实现读取路径用到的方法）"""
+
+    def __init__(self, records: list[UserSecret]) -> None:
+        self._records = records
+
+    def scalar_one_or_none(self):
+        return self._records[0] if self._records else None
+
+    def scalars(self):
+        return self
+
+    def all(self) -> list[UserSecret]:
+        return self._records
+
+
+class _Session:
+    """模拟数据库会话：按查询参数中的密钥名称返回预置的记录"""
+
+    def __init__(self, records: list[UserSecret]) -> None:
+        self._records = records
+
+    async def execute(self, statement, params):
+        names = params.get("secret_names") or [params.get("secret_name")]
+        return _Result([record for record in self._records if record.secret_name in names])
+
+
+@pytest.fixture
+def vault(monkeypatch):
+    """使用 AES-GCM 加密的密钥保管库实例"""
+    monkeypatch.setattr(settings, "SECRET_CIPHER", "aesgcm")
+    service = VaultService()
+    service.encryption = EncryptionService()
+    yield service
+    service._crypto_pool.shutdown(wait=False)
+
+
+@pytest.fixture
+def stored_secrets(vault):
+    """三种格式的已存储密钥：{密钥名称: (明文, 数据库记录)}"""
+    encryption = vault.encryption
+    large_value = "x" * 8192  # 超过线程池卸载阈值
+    values = {
+        "BINARY_KEY": ("sk-binary", encryption.encrypt_bytes("sk-binary")),
+        "V2_TEXT_KEY": ("sk-v2-text", encryption.encrypt("sk-v2-text").encode("ascii")),
+        "FERNET_KEY": ("sk-fernet", encryption.fernet.encrypt(b"sk-fernet")),
+        "LARGE_KEY": (large_value, encryption.encrypt_bytes(large_value)),
+    }
+    return {
+        name: (
+            plaintext,
+            UserSecret(id=index, user_id="u1", prefab_id="p1", secret_name=name, secret_value=ciphertext)
+        )
+        for index, (name, (plaintext, ciphertext)) in enumerate(values.items(), start=1)
+    }
+
+
+def test_binary_format(stored_secrets):
+    """新写入的密钥以 0x02 | nonce | 密文 | tag 的二进制格式存储"""
+    _, record = stored_secrets["BINARY_KEY"]
+    assert record.secret_value[:1] == b"\x02"
+
+
+@pytest.mark.asyncio
+async def test_get_secret_all_formats(vault, stored_secrets):
+    """单个读取：三种存储格式都能解密"""
+    db = _Session([record for _, record in stored_secrets.values()])
+
+    for name, (plaintext, _) in stored_secrets.items():
+        assert await vault.get_secret("u1", "p1", name, db) == plaintext
+
+
+@pytest.mark.asyncio
+async def test_get_secrets_bulk_all_formats(vault, stored_secrets):
+    """批量读取：混合格式的密钥一次解密"""
+    db = _Session([record for _, record in stored_secrets.values()])
+
+    secrets = await vault.get_secrets_bulk("u1", "p1", list(stored_secrets), db)
+
+    assert secrets == {name: plaintext for name, (plaintext, _) in stored_secrets.items()}
+
+
+@pytest.mark.asyncio
+async def test_corrupt_secret_raises_invalid_token(vault):
+    """损坏的非 ASCII 记录应抛出 InvalidToken，而不是 UnicodeDecodeError"""
+    record = UserSecret(id=99, user_id="u1", prefab_id="p1", secret_name="CORRUPT_KEY", secret_value=b"\xff\xfe\x00")
+
+    with pytest.raises(InvalidToken):
+        await vault.get_secret("u1", "p1", "CORRUPT_KEY", _Session([record]))
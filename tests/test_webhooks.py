@@ -0,0 +1,54 @@
+"""
+Webhook 签名校验测试
+"""
+import hashlib
+import hmac
+
+from app.routers.webhooks import _hmac_template, verify_signature
+
+SECRET = "test-webhook-secret"
+
+
+def _sign(payload: bytes, secret: str = SECRET) -> str:
+    """生成十六进制 HMAC-SHA256 签名"""
+    return hmac.new(secret.encode("utf-8"), payload, hashlib.sha256).hexdigest()
+
+
+def test_valid_signature():
+    """正确的签名应通过校验"""
+    payload = b'{"event_id": "deploy-1"}'
+    assert verify_signature(payload, _sign(payload), SECRET)
+
+
+def test_wrong_secret_or_payload():
+    """密钥或载荷不匹配时应拒绝"""
+    payload = b'{"event_id": "deploy-1"}'
+    assert not verify_signature(payload, _sign(payload, "other-secret"), SECRET)
+    assert not verify_signature(b'{"event_id": "deploy-2"}', _sign(payload), SECRET)
+
+
+def test_non_hex_signature():
+    """非十六进制签名应直接拒绝"""
+    payload = b'{"event_id": "deploy-1"}'
+    assert not verify_signature(payload, "z" * 64, SECRET)
+    assert not verify_signature(payload, "", SECRET)
+
+
+def test_wrong_length_signature():
+    """长度不等于 SHA-256 摘要的签名应拒绝"""
+    payload = b'{"event_id": "deploy-1"}'
+    signature = _sign(payload)
+    assert not verify_signature(payload, signature[:-2], SECRET)
+    assert not verify_signature(payload, signature + "00", SECRET)
+
+
+def test_hmac_template_reused_across_calls():
+    """复用同一个 HMAC 模板的多次校验互不影响"""
+    template = _hmac_template(SECRET)
+    payloads = [b"first", b"second", b"first"]
+
+    for payload in payloads:
+        assert verify_signature(payload, _sign(payload), SECRET)
+        assert not verify_signature(payload, _sign(payload + b"!"), SECRET)
+
+    assert _hmac_template(SECRET) is template